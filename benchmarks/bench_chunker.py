@@ -0,0 +1,82 @@
+"""
+Chunker throughput benchmark.
+
+Writes a synthetic manuscript of --size-mb megabytes to a temporary file and
+streams it through TextChunker.iter_chunks, reporting throughput and the
+peak resident set size of the process. With --in-memory the whole file is
+read into one string first, for comparison.
+
+    python benchmarks/bench_chunker.py --size-mb 100
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.text_chunker import TextChunker
+
+SENTENCES = [
+    "The night was long and the road was longer still.",
+    "Did anyone see where the carriage went?",
+    "Nobody answered!",
+    "She waited… and waited, until the lamps went out.",
+    "“We leave at dawn,” he said.",
+    "夜は長かった。",
+    "他们终于到了！",
+]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def write_manuscript(path: str, size_mb: int, seed: int = 42):
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        while written < target:
+            paragraph = ' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 12))) + '\n\n'
+            f.write(paragraph)
+            written += len(paragraph.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--max-tokens', type=int, default=1000)
+    parser.add_argument('--in-memory', action='store_true', help='read the whole file before chunking')
+    args = parser.parse_args()
+
+    chunker = TextChunker(max_tokens=args.max_tokens)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'manuscript.txt')
+        write_manuscript(path, args.size_mb)
+        size = os.path.getsize(path)
+        baseline = peak_rss_mb()
+
+        start = time.perf_counter()
+        chunks = 0
+        with open(path, encoding='utf-8', newline='') as f:
+            source = f.read() if args.in_memory else f
+            for chunk in chunker.iter_chunks(source):
+                chunks += 1
+                last_end = chunk.end
+        elapsed = time.perf_counter() - start
+
+    print(f"input:      {size / 1e6:.1f} MB ({'in memory' if args.in_memory else 'streamed'})")
+    print(f"chunks:     {chunks} (last ends at byte {last_end})")
+    print(f"time:       {elapsed:.2f} s")
+    print(f"throughput: {size / 1e6 / elapsed:.1f} MB/s")
+    print(f"peak RSS:   {peak_rss_mb():.1f} MB (before chunking: {baseline:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Per-chunk database write benchmark.
+
+Replays the writes a translation makes for every finished chunk (one row in
+`chunks` plus the progress of its row in `translations`) from --books
+threads at once, first the old way, with a new sqlite3 connection per
+write in the default rollback-journal mode, then through the shared
+connection pool. Reports write latency percentiles, throughput and the
+writes that failed with `database is locked`.
+
+    python benchmarks/bench_db_writes.py --books 4 --chunks 500
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.database import Database
+
+SCHEMA = '''
+    CREATE TABLE translations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT,
+        progress REAL DEFAULT 0,
+        current_chunk INTEGER DEFAULT 0,
+        updated_at TIMESTAMP
+    );
+    CREATE TABLE chunks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        translation_id INTEGER,
+        chunk_number INTEGER,
+        source_hash TEXT,
+        machine_translation TEXT,
+        translated_text TEXT,
+        status TEXT,
+        attempts INTEGER DEFAULT 0
+    );
+    CREATE UNIQUE INDEX idx_chunks_translation_chunk ON chunks (translation_id, chunk_number);
+'''
+CHUNK_TEXT = 'The night was long and the road was longer still. ' * 80
+
+
+@contextmanager
+def ad_hoc_connection(path: str):
+    # What every module did before: a fresh connection, committed by `with`, never closed explicitly
+    with sqlite3.connect(path) as conn:
+        yield conn
+
+
+def save_chunk(connection, translation_id: int, chunk_number: int, total: int):
+    with connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO chunks (
+                translation_id, chunk_number, source_hash,
+                machine_translation, translated_text, status, attempts
+            ) VALUES (?, ?, ?, ?, ?, 'completed', 1)
+        ''', (translation_id, chunk_number, f'{chunk_number:064x}', CHUNK_TEXT, CHUNK_TEXT))
+        conn.execute('''
+            UPDATE translations
+            SET progress = ?,
+                current_chunk = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (100 * chunk_number / total, chunk_number, translation_id))
+
+
+def run(label: str, path: str, connection, books: int, chunks: int):
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SCHEMA)
+        conn.executemany('INSERT INTO translations (status) VALUES (?)', [('in_progress',)] * books)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def book(translation_id: int):
+        own = []
+        failed = 0
+        for chunk_number in range(1, chunks + 1):
+            start = time.perf_counter()
+            try:
+                save_chunk(connection, translation_id, chunk_number, chunks)
+            except sqlite3.OperationalError:
+                failed += 1
+                continue
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=book, args=(n + 1,)) for n in range(books)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"{label}")
+    print(f"  writes:     {len(latencies)} ok, {sum(errors)} 'database is locked'")
+    print(f"  latency:    p50 {percentile(0.5):.2f} ms, p99 {percentile(0.99):.2f} ms, "
+          f"mean {statistics.mean(latencies) * 1000:.2f} ms")
+    print(f"  throughput: {len(latencies) / elapsed:.0f} chunks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=4, help='books written concurrently')
+    parser.add_argument('--chunks', type=int, default=500, help='chunks per book')
+    parser.add_argument('--synchronous', default='NORMAL')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = os.path.join(tmp, 'before.db')
+        run('before: connection per write, rollback journal', before,
+            lambda: ad_hoc_connection(before), args.books, args.chunks)
+
+        after = os.path.join(tmp, 'after.db')
+        database = Database(after, synchronous=args.synchronous)
+        run(f'after: pooled connections, WAL, synchronous={args.synchronous}', after,
+            database.connection, args.books, args.chunks)
+        database.close()
+
+
+if __name__ == '__main__':
+    main()
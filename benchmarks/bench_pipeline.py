@@ -0,0 +1,321 @@
+"""
+End-to-end translation benchmark against local stub backends.
+
+Starts the stub Ollama and Google Translate servers (benchmarks/stubs.py),
+writes a synthetic book of every --sizes size and translates it through
+translator.py's POST /translate, reading the progress stream to the end, the
+way the web page does. Each book runs in a fresh process and working
+directory, so caches start cold and the peak RSS is that of one book.
+
+Reported per book: chunks/s, wall time, p50/p99 of every traced stage (the
+span timeline of the run, see /translations/<id>/trace) plus database
+writes and SSE delivery (from the stage histograms, so bounded by their
+buckets), peak RSS, bytes written by the process and the size of db/
+afterwards. With a stored baseline, changes beyond --tolerance in the
+wrong direction are listed and the exit status is 1. No baseline is
+shipped, since timings depend on the machine: record one with
+--save-baseline before making a change.
+
+    python benchmarks/bench_pipeline.py --sizes 10KB,1MB,10MB
+    python benchmarks/bench_pipeline.py --sizes 100MB --tokens-per-second 0
+    python benchmarks/bench_pipeline.py --save-baseline
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import STUB_MODEL, add_stub_arguments, start_stubs
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+RESULT_PREFIX = 'RESULT '
+# Stages recorded by the monitor but not traced as spans
+HISTOGRAM_STAGES = ('db_write', 'sse_emit')
+UNITS = {'KB': 1024, 'MB': 1024 * 1024}
+
+
+def parse_size(size: str) -> int:
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*(KB|MB)?', size.strip().upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * UNITS.get(match.group(2) or '', 1))
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def synthetic_book(size: int, seed: int = 42) -> Iterator[str]:
+    """Paragraphs of random words, so chunks do not repeat and every cache starts cold."""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = [''.join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(5000)]
+    written = 0
+    while written < size:
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            words = rng.choices(vocabulary, k=rng.randint(4, 20))
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraph = ' '.join(sentences) + '\n\n'
+        yield paragraph
+        written += len(paragraph)
+
+
+def write_book(path: str, size: int, seed: int = 42):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.writelines(synthetic_book(size, seed))
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bucket_percentile(histogram, stage: str, q: float):
+    """Upper bound of the bucket holding the q-quantile of a stage, over all its label sets."""
+    counts = None
+    for labels, (series, _) in histogram.snapshot().items():
+        if dict(labels).get('stage') == stage:
+            counts = series if counts is None else [a + b for a, b in zip(counts, series)]
+    if not counts or not sum(counts):
+        return None
+    rank = q * sum(counts)
+    seen = 0
+    for bound, count in zip(histogram.buckets + (float('inf'),), counts):
+        seen += count
+        if seen >= rank:
+            return bound
+
+
+def written_bytes(process) -> int:
+    counters = process.io_counters()
+    # write_chars counts every write() on Linux, even to the page cache or tmpfs
+    return getattr(counters, 'write_chars', counters.write_bytes)
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path) for name in names
+    )
+
+
+def run_book(size: int, workdir: str, llm_refine: bool) -> dict:
+    """Translate one synthetic book in this process; translator.py is configured by the environment."""
+    import psutil
+
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    write_book('book.txt', size)
+
+    import translator
+    client = translator.app.test_client()
+    process = psutil.Process()
+    rss_before = peak_rss_mb()
+    written_before = written_bytes(process)
+
+    events = 0
+    start = time.perf_counter()
+    with open('book.txt', 'rb') as book:
+        response = client.post('/translate', data={
+            'file': (book, 'book.txt'),
+            'sourceLanguage': 'en',
+            'targetLanguage': 'fr',
+            'model': STUB_MODEL,
+            'llmRefine': 'true' if llm_refine else 'false'
+        }, buffered=False)
+        for data in response.response:
+            events += data.count(b'\n\n')
+        response.close()
+    wall = time.perf_counter() - start
+
+    translator.writer.flush()
+    with translator.database.connection() as conn:
+        translation_id, status = conn.execute('SELECT id, status FROM translations').fetchone()
+    if status != 'completed':
+        raise RuntimeError(f"Translation ended with status {status}")
+
+    durations = {}
+    for _, _, name, _, duration, _, _ in translator.tracer.load(translation_id)['spans']:
+        durations.setdefault(name, []).append(duration / 1000)
+    stages = {
+        name: {'p50_ms': percentile(values, 0.5), 'p99_ms': percentile(values, 0.99), 'count': len(values)}
+        for name, values in durations.items() if name != 'job'
+    }
+    for name in HISTOGRAM_STAGES:
+        p50 = bucket_percentile(translator.monitor.stage_seconds, name, 0.5)
+        if p50 is not None:
+            stages[name] = {
+                'p50_ms': p50 * 1000,
+                'p99_ms': bucket_percentile(translator.monitor.stage_seconds, name, 0.99) * 1000,
+                'bucketed': True
+            }
+
+    chunks = len(durations.get('chunk', []))
+    return {
+        'bytes': os.path.getsize('book.txt'),
+        'chunks': chunks,
+        'events': events,
+        'wall_s': wall,
+        'chunks_per_s': chunks / wall,
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_before_mb': rss_before,
+        'written_mb': (written_bytes(process) - written_before) / 1e6,
+        'db_mb': directory_bytes('db') / 1e6
+    }
+
+
+def size_label(size: int) -> str:
+    for unit in ('MB', 'KB'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f'{size // UNITS[unit]}{unit}'
+    return f'{size}B'
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float) -> list:
+    """Metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+
+    def check(book: str, metric: str, value: float, before: float, higher_is_better: bool = False):
+        if not before:
+            return
+        change = (value - before) / before
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{book} {metric}: {before:.4g} -> {value:.4g} ({change:+.0%})")
+
+    for book, result in results.items():
+        old = baseline.get('results', {}).get(book)
+        if old is None:
+            continue
+        check(book, 'chunks/s', result['chunks_per_s'], old['chunks_per_s'], higher_is_better=True)
+        for metric in ('wall_s', 'peak_rss_mb', 'written_mb', 'db_mb'):
+            check(book, metric, result[metric], old[metric])
+        for stage, values in result['stages'].items():
+            old_stage = old['stages'].get(stage)
+            if old_stage is None:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                # Sub-millisecond stages are mostly timer noise
+                if max(values[metric], old_stage[metric]) >= min_ms:
+                    check(book, f'{stage} {metric}', values[metric], old_stage[metric])
+    return regressions
+
+
+def print_result(book: str, result: dict):
+    print(f"{book}: {result['bytes'] / 1e6:.2f} MB, {result['chunks']} chunks, {result['events']} events")
+    print(f"  wall time   {result['wall_s']:.2f} s ({result['chunks_per_s']:.1f} chunks/s)")
+    print(f"  peak RSS    {result['peak_rss_mb']:.1f} MB (before the translation: {result['rss_before_mb']:.1f} MB)")
+    print(f"  written     {result['written_mb']:.1f} MB, db/ {result['db_mb']:.1f} MB")
+    for stage, values in sorted(result['stages'].items()):
+        bound = '<=' if values.get('bucketed') else '  '
+        count = f"x{values['count']}" if 'count' in values else ''
+        print(f"  {stage:<20} p50 {bound}{values['p50_ms']:9.2f} ms   p99 {bound}{values['p99_ms']:9.2f} ms  {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10KB,1MB,10MB', help='comma-separated book sizes, e.g. 10KB,1MB,100MB')
+    parser.add_argument('--no-refine', action='store_true', help='machine translation only')
+    parser.add_argument('--chunk-tokens', type=int, default=1000, help='REFINE_CHUNK_TOKENS of the run')
+    parser.add_argument('--ollama-concurrency', type=int, default=4, help='concurrent generations of the stub')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative change before a regression')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore stage latencies below this')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        result = run_book(args.worker, args.workdir, not args.no_refine)
+        print(RESULT_PREFIX + json.dumps(result))
+        return
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    ollama, translate = start_stubs(args)
+    env = dict(
+        os.environ,
+        OLLAMA_ENDPOINTS=f'{ollama.url}|{args.ollama_concurrency}',
+        MT_URL=translate.url,
+        MT_RATE='0',
+        REFINE_CHUNK_TOKENS=str(args.chunk_tokens),
+        TRANSLATION_WORKERS='1'
+    )
+    config = {
+        'sizes': args.sizes,
+        'llm_refine': not args.no_refine,
+        'chunk_tokens': args.chunk_tokens,
+        'ollama_concurrency': args.ollama_concurrency,
+        'ollama_latency': args.ollama_latency,
+        'tokens_per_second': args.tokens_per_second,
+        'ollama_error_rate': args.ollama_error_rate,
+        'mt_latency': args.mt_latency,
+        'mt_chars_per_second': args.mt_chars_per_second,
+        'mt_error_rate': args.mt_error_rate
+    }
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                book = size_label(size)
+                command = [
+                    sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                    '--workdir', os.path.join(tmp, book)
+                ] + (['--no-refine'] if args.no_refine else [])
+                run = subprocess.run(command, env=env, capture_output=True, text=True)
+                lines = [line for line in run.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+                if run.returncode != 0 or not lines:
+                    sys.stderr.write(run.stderr)
+                    raise SystemExit(f"{book}: benchmark run failed")
+                results[book] = json.loads(lines[-1][len(RESULT_PREFIX):])
+                print_result(book, results[book])
+    finally:
+        ollama.stop()
+        translate.stop()
+    print(f"stub requests: ollama {ollama.stats}, machine translation {translate.stats}")
+
+    report = {'config': config, 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print("note: the baseline was recorded with different options")
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        print(f"compared with {args.baseline}: {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        for regression in regressions:
+            print(f"  {regression}")
+        status = 1 if regressions else 0
+    elif not args.save_baseline:
+        # Timings depend on the machine, so no baseline is shipped; each checkout records its own
+        print(f"no baseline at {args.baseline}, nothing compared; record one with --save-baseline")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""
+Concurrent-client load test for translator.py.
+
+Starts translator.py as a server process against the stub backends
+(benchmarks/stubs.py), then steps through --levels. At a level of N, N users
+each translate books one after another: POST /translate?detach=true, follow
+GET /translations/<id>/events to the end, GET /download/<id>. Every user also
+has a dashboard open that polls /translations and /metrics at --poll-rate
+requests per second with random (Poisson) arrivals, which keep coming
+whether or not earlier polls have been answered.
+
+Per level it reports request latency percentiles per endpoint, the gaps
+between SSE events and the wait for the first one, error rates, completed
+translations per minute and the server's CPU and memory (psutil). The
+saturation point is the first level where throughput stops growing by
+--min-gain, the p99 of a request passes --slo-ms or errors pass --max-errors.
+
+    python benchmarks/load_test.py --levels 1,2,4,8,16 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:5001 --pid 12345
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import psutil
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_pipeline import percentile, synthetic_book
+from benchmarks.stubs import STUB_MODEL, add_stub_arguments, start_stubs
+
+SERVER = '''
+import sys
+sys.path.insert(0, {root!r})
+import translator
+translator.app.run(host='127.0.0.1', port={port}, threaded=True)
+'''
+ENDPOINTS = ('translate', 'events', 'download', 'translations', 'metrics')
+
+
+class Recorder:
+    """Latencies, errors and SSE timings of one load level, shared by all client threads."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors: Dict[str, int] = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.sse_gaps: List[float] = []
+        self.first_event: List[float] = []
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def request(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def stream(self, first_event: Optional[float], gaps: List[float], completed: bool):
+        with self._lock:
+            if first_event is not None:
+                self.first_event.append(first_event)
+            self.sse_gaps.extend(gaps)
+            self.completed += completed
+
+
+class ResourceSampler(threading.Thread):
+    """CPU and resident memory of the server process, sampled every `interval` seconds."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid) if pid else None
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss_mb: List[float] = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        if self.process is None:
+            return
+        self.process.cpu_percent()
+        while not self._stopped.wait(self.interval):
+            try:
+                self.cpu.append(self.process.cpu_percent())
+                self.rss_mb.append(self.process.memory_info().rss / (1024 * 1024))
+            except psutil.NoSuchProcess:
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def timed(recorder: Recorder, endpoint: str, call):
+    start = time.perf_counter()
+    try:
+        response = call()
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.request(endpoint, time.perf_counter() - start, ok)
+    return response if ok else None
+
+
+def follow_events(session: requests.Session, url: str, recorder: Recorder, timeout: float) -> bool:
+    """Read a progress stream to its end; True when the translation completed."""
+    start = last = time.perf_counter()
+    first_event = None
+    gaps = []
+    completed = False
+    ok = False
+    try:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            ok = response.status_code < 400
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                now = time.perf_counter()
+                if first_event is None:
+                    first_event = now - start
+                else:
+                    gaps.append(now - last)
+                last = now
+                event = json.loads(line[5:])
+                if 'error' in event:
+                    ok = False
+                completed = completed or event.get('status') == 'completed'
+    except requests.RequestException:
+        ok = False
+    recorder.request('events', time.perf_counter() - start, ok and completed)
+    recorder.stream(first_event, gaps, completed)
+    return completed
+
+
+def translation_user(base_url: str, book_size: int, seeds, recorder: Recorder,
+                     stop: threading.Event, llm_refine: bool, timeout: float):
+    session = requests.Session()
+    while not stop.is_set():
+        book = ''.join(synthetic_book(book_size, next(seeds))).encode('utf-8')
+        response = timed(recorder, 'translate', lambda: session.post(
+            f'{base_url}/translate?detach=true',
+            files={'file': ('book.txt', book)},
+            data={
+                'sourceLanguage': 'en',
+                'targetLanguage': 'fr',
+                'model': STUB_MODEL,
+                'llmRefine': 'true' if llm_refine else 'false'
+            },
+            timeout=timeout
+        ))
+        if response is None:
+            # Do not hammer a server that refuses work
+            stop.wait(1)
+            continue
+        translation_id = response.json()['translation_ids'][0]
+        if follow_events(session, f'{base_url}/translations/{translation_id}/events', recorder, timeout):
+            timed(recorder, 'download', lambda: session.get(f'{base_url}/download/{translation_id}', timeout=timeout))
+
+
+def dashboards(base_url: str, rate: float, recorder: Recorder, stop: threading.Event,
+               pollers: int, timeout: float):
+    """Open-loop polling: arrivals follow the clock, not the answers."""
+    rng = random.Random(0)
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=pollers))
+    pool = ThreadPoolExecutor(max_workers=pollers, thread_name_prefix='dashboard')
+    paths = [('translations', '/translations?limit=20'), ('metrics', '/metrics')]
+    arrivals = 0
+    while rate > 0 and not stop.wait(rng.expovariate(rate)):
+        endpoint, path = paths[arrivals % len(paths)]
+        arrivals += 1
+        pool.submit(timed, recorder, endpoint, lambda path=path: session.get(base_url + path, timeout=timeout))
+    pool.shutdown(wait=True)
+
+
+def run_level(level: int, args, base_url: str, pid: Optional[int], seeds) -> Dict:
+    recorder = Recorder()
+    sampler = ResourceSampler(pid)
+    stop = threading.Event()
+    users = [
+        threading.Thread(target=translation_user, daemon=True, args=(
+            base_url, args.book_kb * 1024, seeds, recorder, stop, not args.no_refine, args.timeout
+        )) for _ in range(level)
+    ]
+    poller = threading.Thread(target=dashboards, daemon=True, args=(
+        base_url, level * args.poll_rate, recorder, stop, max(8, 4 * level), args.timeout
+    ))
+
+    sampler.start()
+    start = time.perf_counter()
+    for thread in users + [poller]:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    # Translations under way finish and count towards this level
+    for thread in users + [poller]:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    requests_total = sum(len(values) for values in recorder.latencies.values())
+    errors_total = sum(recorder.errors.values())
+    summarize = lambda values: {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.5) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000
+    } if values else None
+    return {
+        'level': level,
+        'elapsed_s': elapsed,
+        'translations_per_min': recorder.completed / elapsed * 60,
+        'requests_per_s': requests_total / elapsed,
+        'error_rate': errors_total / requests_total if requests_total else 0.0,
+        'errors': dict(recorder.errors),
+        'latency': {endpoint: summarize(values) for endpoint, values in recorder.latencies.items()},
+        'sse_gap': summarize(recorder.sse_gaps),
+        'sse_first_event': summarize(recorder.first_event),
+        'cpu_percent': {
+            'mean': sum(sampler.cpu) / len(sampler.cpu) if sampler.cpu else None,
+            'max': max(sampler.cpu, default=None)
+        },
+        'rss_mb_max': max(sampler.rss_mb, default=None)
+    }
+
+
+def saturation(results: List[Dict], args) -> Optional[str]:
+    previous = None
+    for result in results:
+        # Streams and their downloads take as long as a translation; the SLO is for plain requests
+        slow = [
+            endpoint for endpoint in ('translate', 'translations', 'metrics', 'download')
+            if result['latency'][endpoint] and result['latency'][endpoint]['p99_ms'] > args.slo_ms
+        ]
+        if result['error_rate'] > args.max_errors:
+            return f"level {result['level']}: {result['error_rate']:.1%} of requests failed"
+        if slow:
+            return f"level {result['level']}: p99 of {', '.join(slow)} above {args.slo_ms:.0f} ms"
+        if previous and previous['translations_per_min'] and \
+                result['translations_per_min'] < previous['translations_per_min'] * (1 + args.min_gain):
+            return (f"level {result['level']}: {result['translations_per_min']:.1f} translations/min, "
+                    f"less than {args.min_gain:.0%} above level {previous['level']}")
+        previous = result
+    return None
+
+
+def print_report(results: List[Dict], args):
+    fmt = lambda stats, key: f"{stats[key]:8.1f}" if stats else f"{'-':>8}"
+    print()
+    print(f"{'level':>5} {'tr/min':>7} {'req/s':>7} {'errors':>7} {'cpu%':>6} {'rss MB':>7}  "
+          f"{'gap p50':>8} {'gap p99':>8}  " + '  '.join(f'{endpoint + " p99":>16}' for endpoint in ENDPOINTS))
+    top = max((result['translations_per_min'] for result in results), default=0) or 1
+    for result in results:
+        cpu = result['cpu_percent']['mean']
+        rss = result['rss_mb_max']
+        print(f"{result['level']:>5} {result['translations_per_min']:7.1f} {result['requests_per_s']:7.1f} "
+              f"{result['error_rate']:7.1%} {cpu if cpu is not None else float('nan'):6.0f} "
+              f"{rss if rss is not None else float('nan'):7.0f}  "
+              f"{fmt(result['sse_gap'], 'p50_ms')} {fmt(result['sse_gap'], 'p99_ms')}  "
+              + '  '.join(f"{fmt(result['latency'][endpoint], 'p99_ms'):>16}" for endpoint in ENDPOINTS))
+    print("\nthroughput by level (translations/min)")
+    for result in results:
+        bar = '#' * int(40 * result['translations_per_min'] / top)
+        print(f"{result['level']:>5} {bar} {result['translations_per_min']:.1f}")
+    knee = saturation(results, args)
+    print(f"\nsaturation: {knee or 'not reached at the levels tested'}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url: str, process: Optional[subprocess.Popen], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"translator.py exited with status {process.returncode}")
+        try:
+            requests.get(f'{base_url}/metrics', timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise SystemExit(f"{base_url} did not answer within {timeout:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,2,4,8', help='comma-separated numbers of concurrent users')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per level')
+    parser.add_argument('--poll-rate', type=float, default=1.0, help='dashboard polls per second per user')
+    parser.add_argument('--book-kb', type=int, default=20, help='size of every translated book')
+    parser.add_argument('--no-refine', action='store_true', help='machine translation only')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds before a request is abandoned')
+    parser.add_argument('--slo-ms', type=float, default=1000, help='p99 latency of a request that counts as saturated')
+    parser.add_argument('--max-errors', type=float, default=0.01, help='error rate that counts as saturated')
+    parser.add_argument('--min-gain', type=float, default=0.1, help='throughput growth expected from the next level')
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--pid', type=int, help='process to sample CPU and memory of, with --url')
+    parser.add_argument('--workers', type=int, default=2, help='TRANSLATION_WORKERS of the started server')
+    parser.add_argument('--ollama-concurrency', type=int, default=4, help='concurrent generations of the stub')
+    parser.add_argument('--json', help='also write the results to this file')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',') if level.strip()]
+
+    stubs = ()
+    server = None
+    workdir = None
+    if args.url:
+        base_url, pid = args.url.rstrip('/'), args.pid
+    else:
+        stubs = start_stubs(args)
+        ollama, translate = stubs
+        port = free_port()
+        workdir = tempfile.TemporaryDirectory()
+        env = dict(
+            os.environ,
+            OLLAMA_ENDPOINTS=f'{ollama.url}|{args.ollama_concurrency}',
+            MT_URL=translate.url,
+            MT_RATE='0',
+            TRANSLATION_WORKERS=str(args.workers)
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-c', SERVER.format(root=ROOT, port=port)],
+            cwd=workdir.name, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url, pid = f'http://127.0.0.1:{port}', server.pid
+
+    results = []
+    try:
+        wait_until_up(base_url, server)
+        seeds = iter(range(1, 1 << 30))
+        for level in levels:
+            print(f"level {level}: {level} translating users, {level * args.poll_rate:.1f} polls/s "
+                  f"for {args.duration:.0f}s", flush=True)
+            results.append(run_level(level, args, base_url, pid, seeds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            workdir.cleanup()
+        for stub in stubs:
+            stub.stop()
+
+    print_report(results, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'levels': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
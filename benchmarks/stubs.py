@@ -0,0 +1,233 @@
+"""
+Local stand-ins for the Ollama and Google Translate backends.
+
+StubOllama answers /api/tags and /api/generate like Ollama, streamed or not,
+after a fixed latency and at a fixed token rate; StubTranslate answers like
+translate.google.com/m, which GoogleMachineTranslator parses. Both fail a
+share of requests on purpose (503 and 429 with Retry-After), which the
+translator retries with backoff. Run this file to keep both up for a server
+started by hand:
+
+    python benchmarks/stubs.py --ollama-port 11434 --mt-port 8089
+    OLLAMA_ENDPOINTS=http://127.0.0.1:11434 MT_URL=http://127.0.0.1:8089/m python translator.py
+"""
+import argparse
+import html
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+STUB_MODEL = 'stub:latest'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, status: int):
+        stub = self.server.stub
+        body = json.dumps({'error': 'injected failure'}).encode('utf-8')
+        self._send(status, body, 'application/json', {'Retry-After': str(stub.retry_after)})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop pooled keep-alive connections when they exit
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _StubServer:
+    """An HTTP server on a background thread; `url` is known once started."""
+
+    handler = _Handler
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.05,
+                 host: str = '127.0.0.1', port: int = 0, seed: int = 0):
+        self.latency = latency # seconds before every answer
+        self.error_rate = error_rate # share of requests answered with an error
+        self.retry_after = retry_after # seconds the client is told to wait after an error
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.stats = {'requests': 0, 'errors': 0}
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self._server.server_address[1]}'
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.stats['requests'] += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.stats['errors'] += 1
+            return failed
+
+    def start(self) -> '_StubServer':
+        self._server = _Server((self.host, self.port), self.handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _OllamaHandler(_Handler):
+    def do_GET(self):
+        if urlparse(self.path).path != '/api/tags':
+            return self._send(404, b'{}', 'application/json')
+        body = json.dumps({'models': [{'name': STUB_MODEL}]}).encode('utf-8')
+        self._send(200, body, 'application/json')
+
+    def do_POST(self):
+        stub = self.server.stub
+        if urlparse(self.path).path != '/api/generate':
+            return self._send(404, b'{}', 'application/json')
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        time.sleep(stub.latency)
+        if stub.should_fail():
+            return self._fail(503)
+
+        # The text to refine follows the instruction on the first line; send it back word by word
+        words = request['prompt'].partition('\n')[2].split()
+        delay = stub.words_per_message / stub.tokens_per_second if stub.tokens_per_second else 0
+        if not request.get('stream', True):
+            time.sleep(delay * len(words) / stub.words_per_message)
+            body = json.dumps({'model': request['model'], 'response': ' '.join(words), 'done': True})
+            return self._send(200, body.encode('utf-8'), 'application/json')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(words), stub.words_per_message):
+            time.sleep(delay)
+            piece = ' '.join(words[start:start + stub.words_per_message]) + ' '
+            self._write_chunk({'model': request['model'], 'response': piece, 'done': False})
+        self._write_chunk({'model': request['model'], 'response': '', 'done': True})
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, message: Dict):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+
+
+class StubOllama(_StubServer):
+    """
+    Ollama stand-in that returns the text it was asked to refine.
+
+    Generation takes `latency` seconds to start and then streams
+    `words_per_message` words per NDJSON line at `tokens_per_second` words
+    per second (0 for no delay).
+    """
+
+    handler = _OllamaHandler
+
+    def __init__(self, tokens_per_second: float = 0.0, words_per_message: int = 8, **options):
+        super().__init__(**options)
+        self.tokens_per_second = tokens_per_second
+        self.words_per_message = max(1, words_per_message)
+
+
+class _TranslateHandler(_Handler):
+    def do_GET(self):
+        stub = self.server.stub
+        text = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        time.sleep(stub.latency + (len(text) / stub.chars_per_second if stub.chars_per_second else 0))
+        if stub.should_fail():
+            return self._fail(429)
+        body = f'<html><body><div class="result-container">{html.escape(text)}</div></body></html>'
+        self._send(200, body.encode('utf-8'), 'text/html; charset=utf-8')
+
+
+class StubTranslate(_StubServer):
+    """
+    Google Translate stand-in for GoogleMachineTranslator (MT_URL) that
+    returns the text unchanged after `latency` seconds plus the time to read
+    it at `chars_per_second` (0 for no delay).
+    """
+
+    handler = _TranslateHandler
+
+    def __init__(self, chars_per_second: float = 0.0, **options):
+        super().__init__(**options)
+        self.chars_per_second = chars_per_second
+
+    @property
+    def url(self) -> str:
+        return super().url + '/m'
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('stub backends')
+    group.add_argument('--ollama-latency', type=float, default=0.02, help='seconds before a generation starts')
+    group.add_argument('--tokens-per-second', type=float, default=2000, help='stub generation speed (0 = no delay)')
+    group.add_argument('--ollama-error-rate', type=float, default=0.0, help='share of generations answered 503')
+    group.add_argument('--mt-latency', type=float, default=0.01, help='seconds per machine translation request')
+    group.add_argument('--mt-chars-per-second', type=float, default=0, help='machine translation speed (0 = no delay)')
+    group.add_argument('--mt-error-rate', type=float, default=0.0, help='share of machine translation requests answered 429')
+
+
+def start_stubs(args, ollama_port: int = 0, mt_port: int = 0):
+    """Start both stubs from the options of add_stub_arguments."""
+    ollama = StubOllama(
+        latency=args.ollama_latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.ollama_error_rate,
+        port=ollama_port
+    ).start()
+    translate = StubTranslate(
+        latency=args.mt_latency,
+        chars_per_second=args.mt_chars_per_second,
+        error_rate=args.mt_error_rate,
+        port=mt_port,
+        seed=1
+    ).start()
+    return ollama, translate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ollama-port', type=int, default=11434)
+    parser.add_argument('--mt-port', type=int, default=8089)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    ollama, translate = start_stubs(args, args.ollama_port, args.mt_port)
+    print(f"OLLAMA_ENDPOINTS={ollama.url} MT_URL={translate.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ollama.stop()
+        translate.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,10 @@ from collections import deque
 from dataclasses import dataclass, field
 from typing import Dict
 
+from components.metrics import Counter, Histogram
+
+METRIC_PREFIX = 'book_translator'
+
 # Monitoring setup
 @dataclass
 class TranslationMetrics:
@@ -13,24 +17,46 @@ class TranslationMetrics:
     failed_translations: int = 0
     average_translation_time: float = 0
     translation_times: deque = field(default_factory=lambda: deque(maxlen=100))
+    translation_times_sum: float = 0
 
 class AppMonitor:
+    """
+    Application metrics. `get_metrics` is the JSON summary served at
+    /metrics; the stage latency histogram and the counters are exported in
+    the Prometheus text format by `render_prometheus`.
+
+    Stages: chunking, cache_lookup, google_mt, ollama_refinement,
+    ollama_first_token, db_write and sse_emit.
+    """
+
     def __init__(self):
         self.metrics = TranslationMetrics()
         self._lock = threading.Lock()
         self.start_time = time.time()
+        self.stage_seconds = Histogram(
+            f'{METRIC_PREFIX}_stage_seconds',
+            'Time spent in each pipeline stage, per operation'
+        )
+        self.chunks = Counter(f'{METRIC_PREFIX}_chunks_total', 'Chunks finished, by where the result came from')
+        self.stage_errors = Counter(f'{METRIC_PREFIX}_stage_errors_total', 'Failed operations per pipeline stage')
         
     def record_translation_attempt(self, success: bool, translation_time: float):
         with self._lock:
             self.metrics.total_requests += 1
             if success:
                 self.metrics.successful_translations += 1
-                self.metrics.translation_times.append(translation_time)
-                self.metrics.average_translation_time = (
-                    sum(self.metrics.translation_times) / len(self.metrics.translation_times)
-                )
+                times = self.metrics.translation_times
+                # A running sum keeps the average O(1) however long the window is
+                if len(times) == times.maxlen:
+                    self.metrics.translation_times_sum -= times[0]
+                times.append(translation_time)
+                self.metrics.translation_times_sum += translation_time
+                self.metrics.average_translation_time = self.metrics.translation_times_sum / len(times)
             else:
                 self.metrics.failed_translations += 1
+
+    def observe_stage(self, stage: str, seconds: float, **labels):
+        self.stage_seconds.observe(seconds, stage=stage, **labels)
     
     def get_system_metrics(self) -> Dict:
         return {
@@ -61,3 +87,23 @@ class AppMonitor:
                 metrics_data['translation_metrics']['success_rate'] = 0
                 
             return metrics_data
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            totals = [
+                ('successful', self.metrics.successful_translations),
+                ('failed', self.metrics.failed_translations)
+            ]
+        lines = [
+            f'# HELP {METRIC_PREFIX}_translations_total Translations finished, by result',
+            f'# TYPE {METRIC_PREFIX}_translations_total counter'
+        ]
+        lines += [f'{METRIC_PREFIX}_translations_total{{result="{result}"}} {value}' for result, value in totals]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_uptime_seconds Seconds since the server started',
+            f'# TYPE {METRIC_PREFIX}_uptime_seconds gauge',
+            f'{METRIC_PREFIX}_uptime_seconds {time.time() - self.start_time}'
+        ]
+        for family in (self.stage_seconds, self.chunks, self.stage_errors):
+            lines += family.render()
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,150 @@
+import codecs
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import time
+import zlib
+from typing import IO, Iterable, Iterator, Set, Tuple
+
+from charset_normalizer import from_bytes
+
+BLOB_ROOT = 'db/blobs' # Define BLOB_ROOT here
+PREFIX_SIZE = 64 * 1024
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    Guess the charset of a file from its first bytes. UTF-8 is tried first,
+    then charset_normalizer, and cp1251 remains the last resort as before.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Not final: the prefix may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    best = from_bytes(prefix).best()
+    return best.encoding if best is not None else 'cp1251'
+
+
+class _MappedFile(io.RawIOBase):
+    def __init__(self, mapped: mmap.mmap):
+        self._mapped = mapped
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._mapped.close()
+        super().close()
+
+
+# Blob store setup
+class BlobStore:
+    """
+    Content-addressed file storage for book texts.
+
+    A blob is stored once under the SHA-256 of its bytes, which is computed
+    while the content is written, so identical uploads share one file and
+    database rows only keep the digest. Texts are read back through mmap.
+    """
+
+    def __init__(self, root: str = BLOB_ROOT):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def _write(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for data in chunks:
+                    sha256.update(data)
+                    f.write(data)
+                    size += len(data)
+            digest = sha256.hexdigest()
+            path = self.path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                # Refresh the age of a shared blob so garbage collection keeps it
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+            return digest, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_stream(self, stream: IO[bytes], block_size: int = 1 << 16) -> Tuple[str, int]:
+        """Store a binary stream. Returns (digest, size in bytes)."""
+        return self._write(iter(lambda: stream.read(block_size), b''))
+
+    def put_text(self, parts: Iterable[str], separator: str = '') -> str:
+        """Store text given as parts joined by separator, encoded as UTF-8."""
+        def encoded():
+            for n, part in enumerate(parts):
+                if n and separator:
+                    yield separator.encode('utf-8')
+                yield part.encode('utf-8')
+        return self._write(encoded())[0]
+
+    def read_prefix(self, digest: str, size: int = PREFIX_SIZE) -> bytes:
+        with open(self.path(digest), 'rb') as f:
+            return f.read(size)
+
+    def open_text(self, digest: str, encoding: str = 'utf-8') -> IO[str]:
+        """Open a blob as a memory-mapped text stream with universal newlines."""
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return io.StringIO('')
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return io.TextIOWrapper(io.BufferedReader(_MappedFile(mapped)), encoding=encoding, errors='replace')
+
+    def read_text(self, digest: str, encoding: str = 'utf-8') -> str:
+        with self.open_text(digest, encoding) as f:
+            return f.read()
+
+    def iter_gzip(self, digest: str, block_size: int = 1 << 16, level: int = 6) -> Iterator[bytes]:
+        """Gzip a blob on the fly, a block at a time, without writing anything to disk."""
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        with open(self.path(digest), 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                data = compressor.compress(block)
+                if data:
+                    yield data
+        yield compressor.flush()
+
+    def remove_unreferenced(self, referenced: Set[str], min_age: float = 3600) -> int:
+        """
+        Delete blobs that no row refers to. Blobs younger than min_age seconds
+        are kept, since an upload is stored before its row is written.
+        """
+        removed = 0
+        cutoff = time.time() - min_age
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if filename in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
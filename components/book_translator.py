@@ -1,7 +1,7 @@
 import json
 import requests
 import time
-from typing import List, Dict, Optional, Tuple, Callable
+from typing import IO, List, Dict, Optional, Tuple, Callable, Union
 from tqdm import tqdm
 import os
 import sqlite3
@@ -13,121 +13,363 @@ import traceback
 import psutil
 import threading
 from collections import deque
+from concurrent.futures import Future, wait
 from dataclasses import dataclass, field
 from functools import wraps
 from flask import Flask, request, jsonify, Response, send_file, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from deep_translator import GoogleTranslator
+
+from components.chunk_pipeline import ChunkPipeline
+from components.chunk_store import ChunkStore
+from components.database import get_database
+from components.machine_translation import (
+    MAX_REQUEST_CHARS, GoogleMachineTranslator, MachineTranslationStage, MachineTranslator
+)
+from components.ollama_pool import OllamaEndpoint, RefinementDispatcher
+from components.rate_limiter import RateLimiter
+from components.segment_cache import SEGMENT_SEPARATOR, SegmentCache
+from components.text_chunker import (
+    PROMPT_OVERHEAD_TOKENS, TextChunker, context_window, estimate_tokens, refinement_token_budget
+)
+from components.tracer import NULL_TRACE, Tracer
 
 DB_PATH = 'db/translations.db' # Define DB_PATH here
 
+
+class _JoinedResult:
+    """Future-like join of text parts, some of which are still being refined."""
+
+    def __init__(self, parts: List, partials: Optional[Dict[int, List[str]]] = None):
+        self.parts = parts
+        self.partials = partials or {} # streamed tokens of the parts still being refined, by position
+
+    @property
+    def futures(self) -> List[Future]:
+        return [part for part in self.parts if isinstance(part, Future)]
+
+    def result(self) -> str:
+        return SEGMENT_SEPARATOR.join(
+            part.result() if isinstance(part, Future) else part for part in self.parts
+        )
+
+    def partial_text(self) -> str:
+        texts = []
+        for position, part in enumerate(self.parts):
+            if not isinstance(part, Future):
+                texts.append(part)
+            elif part.done() and part.exception() is None:
+                texts.append(part.result())
+            else:
+                texts.append(''.join(self.partials.get(position, ())))
+        return SEGMENT_SEPARATOR.join(texts)
+
+    def cancel(self):
+        for part in self.parts:
+            if isinstance(part, Future):
+                part.cancel()
+
+
 class BookTranslator:
-    def __init__(self, model_name: str = "aya-expanse:32b", chunk_size: int = 1000, llm_refine: bool = True):
+    def __init__(self, model_name: str = "aya-expanse:32b", chunk_size: Optional[int] = None, llm_refine: bool = True,
+                 pipeline_depth: int = 4, dispatcher: Optional[RefinementDispatcher] = None,
+                 stream_refinement: bool = True, stall_timeout: float = 30.0, partial_interval: float = 0.5,
+                 first_token_timeout: float = 1800.0,
+                 mt_limiter: Optional[RateLimiter] = None, mt_workers: int = 8,
+                 mt_backend: Optional[Callable[[str, str], MachineTranslator]] = None,
+                 tracer: Optional[Tracer] = None):
         self.model_name = model_name
-        self.api_url = "http://localhost:11434/api/generate"
-        self.chunk_size = chunk_size
-        self.session = requests.Session()
-        self.session.mount('http://', requests.adapters.HTTPAdapter(
-            max_retries=3,
-            pool_connections=10,
-            pool_maxsize=10
-        ))
+        self.dispatcher = dispatcher or RefinementDispatcher()
+        self.api_url = self.dispatcher.primary.generate_url
+        self.chunk_size = chunk_size or refinement_token_budget(model_name) # tokens per refinement chunk
+        self.chunker = TextChunker(max_tokens=self.chunk_size, max_chars=MAX_REQUEST_CHARS)
+        # Room for a translation memory edit (three texts in, one out) when the model has it; see _edit_fits
+        self.num_ctx = min(context_window(model_name), 4 * self.chunk_size + PROMPT_OVERHEAD_TOKENS)
+        self.session = self.dispatcher.session
         self.llm_refine = llm_refine # add llm_refine
+        self.pipeline_depth = pipeline_depth # machine translations allowed to run ahead of refinement
+        self.stream_refinement = stream_refinement # forward partial refinements as they are generated
+        self.stall_timeout = stall_timeout # seconds without a token before a streamed generation is abandoned
+        self.first_token_timeout = first_token_timeout # seconds for model load and prompt evaluation
+        self.partial_interval = partial_interval # seconds between partial refinement events
+        self.mt_limiter = mt_limiter or RateLimiter(rate=1.0, name='google') # shared by all jobs when passed in
+        self.mt_workers = mt_workers # machine translation requests in flight per translation
+        self.mt_backend = mt_backend or (
+            lambda source_lang, target_lang: GoogleMachineTranslator(source_lang, target_lang, limiter=self.mt_limiter)
+        )
+        self.monitor = None # set by translate_text; stage timings are recorded there
+        self.tracer = tracer # span tree per run, when given
+        self.metric_labels = {'model': model_name, 'target_lang': ''}
 
-    def split_into_chunks(self, text: str) -> list:
-        """Split text into smaller chunks for translation."""
-        MAX_LENGTH = 4500  # Google Translate limit
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for paragraph in paragraphs:
-            if len(paragraph) + current_length > MAX_LENGTH:
-                if current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # Split long paragraphs if needed
-                if len(paragraph) > MAX_LENGTH:
-                    sentences = paragraph.split('. ')
-                    temp_chunk = []
-                    temp_length = 0
-                    
-                    for sentence in sentences:
-                        if temp_length + len(sentence) > MAX_LENGTH:
-                            if temp_chunk:
-                                chunks.append('. '.join(temp_chunk) + '.')
-                                temp_chunk = []
-                                temp_length = 0
-                        temp_chunk.append(sentence)
-                        temp_length += len(sentence) + 2  # +2 for '. '
-                        
-                    if temp_chunk:
-                        chunks.append('. '.join(temp_chunk) + '.')
-                else:
-                    current_chunk.append(paragraph)
-                    current_length = len(paragraph)
-            else:
-                current_chunk.append(paragraph)
-                current_length += len(paragraph) + 2  # +2 for '\n\n'
-                
-        if current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
-            
-        return chunks
+    def _observe(self, stage: str, seconds: float, success: bool = True):
+        if self.monitor is None:
+            return
+        self.monitor.observe_stage(stage, seconds, **self.metric_labels)
+        if not success:
+            self.monitor.stage_errors.inc(stage=stage, **self.metric_labels)
+
+    def _traced(self, trace, name: str, parent: int, endpoint: OllamaEndpoint, generate: Callable[[], str]) -> str:
+        # Runs on a dispatcher thread, so the span shows which endpoint served the chunk and for how long
+        with trace.span(name, parent, endpoint=endpoint.url):
+            return generate()
 
-    def translate_text(self, text: str, source_lang: str, target_lang: str, translation_id: int, logger, monitor, cache):
+    def _edit_fits(self, chunk: str, match: Dict) -> bool:
+        """Whether the edit prompt of a memory match and its output fit in num_ctx."""
+        source_tokens = estimate_tokens(chunk)
+        previous_tokens = estimate_tokens(match['original_text'])
+        translation_tokens = estimate_tokens(match['translated_text'])
+        output_tokens = max(source_tokens, translation_tokens)
+        needed = PROMPT_OVERHEAD_TOKENS + source_tokens + previous_tokens + translation_tokens + output_tokens
+        return needed <= self.num_ctx
+
+    def split_into_chunks(self, text: Union[str, IO[str]]) -> list:
+        """Split text, or a text stream, into refinement chunks of at most chunk_size estimated tokens."""
+        return self.chunker.split(text)
+
+    def translate_text(self, text: Union[str, IO[str]], source_lang: str, target_lang: str, translation_id: int, logger, monitor, cache):
+        """
+        Translate text chunk by chunk, yielding progress events.
+
+        Events that carry text include only the chunk named by `chunk_index`;
+        see components.progress_stream for the wire formats built from them.
+        A text stream (such as a mapped blob) is read once and closed.
+        """
         start_time = time.time()
         success = False
-        
+        pipeline = None
+        mt_results = None
+        chunk_store = ChunkStore(DB_PATH)
+        database = get_database(DB_PATH)
+        self.monitor = monitor
+        self.metric_labels = {'model': self.model_name, 'target_lang': target_lang}
+        trace = self.tracer.start(translation_id) if self.tracer else NULL_TRACE
+        chunk_spans = {}
+
+        def observe_mt(seconds: float, success: bool):
+            self._observe('google_mt', seconds, success)
+            trace.record('google_mt', seconds, ok=success)
+
         try:
-            chunks = self.split_into_chunks(text)
+            stage_start = time.perf_counter()
+            try:
+                chunks = self.split_into_chunks(text)
+            finally:
+                if not isinstance(text, str):
+                    text.close()
+            self._observe('chunking', time.perf_counter() - stage_start)
+            trace.record('chunking', time.perf_counter() - stage_start)
             total_chunks = len(chunks)
             translated_chunks = []
             machine_translations = []
             
             logger.translation_logger.info(f"Starting translation {translation_id} with {total_chunks} chunks")
+
+            # Chunks finished by an earlier run of this translation are reused as they are
+            completed_chunks = chunk_store.get_completed_chunks(translation_id, chunks)
+            if completed_chunks:
+                logger.translation_logger.info(
+                    f"Resuming translation {translation_id}: {len(completed_chunks)}/{total_chunks} chunks already done"
+                )
             
-            # Initialize Google translator
-            translator = GoogleTranslator(
-                source=source_lang if source_lang != 'auto' else 'auto',
-                target=target_lang
+            # Resolve every cache hit up front so only the misses are scheduled
+            stage_start = time.perf_counter()
+            pending_numbers = [i for i in range(1, total_chunks + 1) if i not in completed_chunks]
+            pending = [chunks[i - 1] for i in pending_numbers]
+            cached_chunks = {
+                pending_numbers[position]: entry
+                for position, entry in cache.get_cached_translations(pending, source_lang, target_lang).items()
+            }
+
+            # Chunks that missed can still be assembled from cached paragraphs, in one more pass
+            segment_hits = {}
+            if cache.segments is not None:
+                segment_owners = []
+                segments = []
+                for i in pending_numbers:
+                    if i in cached_chunks:
+                        continue
+                    for position, segment in enumerate(cache.segments.split(chunks[i - 1])):
+                        segment_owners.append((i, position))
+                        segments.append(segment)
+                for n, entry in cache.segments.lookup(segments, source_lang, target_lang).items():
+                    i, position = segment_owners[n]
+                    segment_hits.setdefault(i, {})[position] = entry
+                del segment_owners, segments
+                for i, hits in list(segment_hits.items()):
+                    chunk_segments = cache.segments.split(chunks[i - 1])
+                    # Blank paragraphs need no translation; they are passed through next to real hits
+                    for position, segment in enumerate(chunk_segments):
+                        if not cache.segments.normalize(segment):
+                            hits.setdefault(position, {'machine_translation': '', 'translated_text': ''})
+                    if len(hits) == len(chunk_segments):
+                        cached_chunks[i] = {
+                            key: SEGMENT_SEPARATOR.join(hits[position][key] for position in range(len(chunk_segments)))
+                            for key in ('machine_translation', 'translated_text')
+                        }
+                        del segment_hits[i]
+
+            # Plan the machine translation requests of the whole book so they can be sent concurrently
+            tm_matches = {}
+            mt_plan = {}
+            for i in pending_numbers:
+                if i in cached_chunks:
+                    continue
+                # Near-duplicates of cached chunks are reused or edited instead of refined from scratch
+                match = cache.find_similar(chunks[i - 1], source_lang, target_lang)
+                if match and not match['reuse'] and not self._edit_fits(chunks[i - 1], match):
+                    # Refined from scratch instead of a truncated edit prompt
+                    match = None
+                if match:
+                    tm_matches[i] = match
+                    if match['reuse']:
+                        continue
+                if i in segment_hits:
+                    units = self._segment_runs(chunks[i - 1], segment_hits[i], cache.segments)
+                else:
+                    units = [chunks[i - 1]]
+                # Refinement chunks are cut further to the MT request limit
+                mt_plan[i] = [self.chunker.split_for_mt(unit) for unit in units]
+            self._observe('cache_lookup', time.perf_counter() - stage_start)
+            trace.record('cache_lookup', time.perf_counter() - stage_start)
+
+            logger.translation_logger.info(
+                f"Translation {translation_id}: {len(cached_chunks)} cached, "
+                f"{len(segment_hits)} partly cached, "
+                f"{len(pending) - len(cached_chunks)} to translate"
             )
 
+            # Machine translations are produced in chunk order, ahead of the pipeline
+            mt_stage = MachineTranslationStage(
+                self.mt_backend(source_lang, target_lang),
+                workers=self.mt_workers,
+                observe=observe_mt
+            )
+            mt_results = mt_stage.map(
+                piece for i in sorted(mt_plan) for pieces, _ in mt_plan[i] for piece in pieces
+            )
+
+            def take_machine_translations(i: int) -> List[str]:
+                return [
+                    self.chunker.join([next(mt_results) for _ in pieces], separators)
+                    for pieces, separators in mt_plan[i]
+                ]
+
             
             # Update database with total chunks
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.connection() as conn:
                 conn.execute('''
                     UPDATE translations 
                     SET total_chunks = ?, status = 'in_progress'
                     WHERE id = ?
                 ''', (total_chunks * 2, translation_id))
+
+            yield {
+                'progress': 0,
+                'stage': 'planning',
+                'current_chunk': 0,
+                'total_chunks': total_chunks * 2,
+                'cached_chunks': len(cached_chunks),
+                'resumed_chunks': len(completed_chunks)
+            }
+
+            def machine_stage(i: int, chunk: str) -> Dict:
+                # Stage 1 runs ahead of refinement in the pipeline thread
+                chunk_span = chunk_spans[i] = trace.begin('chunk', index=i)
+                if i in completed_chunks:
+                    return {'cached': completed_chunks[i], 'resumed': True}
+                if i in cached_chunks:
+                    logger.translation_logger.info(f"Cache hit for chunk {i}")
+                    return {'cached': cached_chunks[i]}
+                try:
+                    match = tm_matches.get(i)
+                    if match and match['reuse']:
+                        logger.translation_logger.info(
+                            f"Translation memory reuse for chunk {i} (similarity {match['similarity']:.2f})"
+                        )
+                        return {'cached': match}
+
+                    if i in segment_hits:
+                        logger.translation_logger.info(
+                            f"Translating {i}/{total_chunks} from {len(segment_hits[i])} cached paragraphs"
+                        )
+                        with trace.span('machine_translation', chunk_span):
+                            run_translations = take_machine_translations(i)
+                        result = self._translate_segments(
+                            chunk, segment_hits[i], run_translations, target_lang, cache.segments,
+                            trace, chunk_span
+                        )
+                        result['segment_hits'] = set(segment_hits[i])
+                        if 'refinement' in result:
+                            inflight.append(result['refinement'])
+                        return result
+
+                    # Stage 1: Google Translate
+                    logger.translation_logger.info(f"Translating chunk {i}/{total_chunks}")
+                    with trace.span('machine_translation', chunk_span):
+                        google_translation = take_machine_translations(i)[0]
+
+                    logger.translation_logger.info(f"Google translation for chunk {i}: {google_translation}")
+                    result = {'machine_translation': google_translation}
+                    # Streamed tokens are collected here while the consumer is still busy with earlier chunks
+                    partial = [] if self.stream_refinement else None
+                    on_token = partial.append if partial is not None else None
+                    partial_text = (lambda: ''.join(partial)) if partial is not None else None
+                    if self.llm_refine and match:
+                        logger.translation_logger.info(
+                            f"Translation memory edit for chunk {i} (similarity {match['similarity']:.2f})"
+                        )
+                        result['refinement'] = self.dispatcher.submit(
+                            lambda endpoint: self._traced(
+                                trace, 'revision', chunk_span, endpoint,
+                                lambda: self.revise_translation(chunk, target_lang, match, endpoint.generate_url, on_token)
+                            )
+                        )
+                        result['partial'] = partial_text
+                        inflight.append(result['refinement'])
+                    elif self.llm_refine:
+                        # Stage 2 is dispatched right away; the consumer collects results in chunk order
+                        result['refinement'] = self.dispatcher.submit(
+                            lambda endpoint: self._traced(
+                                trace, 'refinement', chunk_span, endpoint,
+                                lambda: self.refine_translation(google_translation, target_lang, endpoint.generate_url, on_token)
+                            )
+                        )
+                        result['partial'] = partial_text
+                        inflight.append(result['refinement'])
+                    return result
+                except Exception as e:
+                    error_msg = f"Error processing chunk {i}: {str(e)}"
+                    logger.translation_logger.error(error_msg)
+                    logger.translation_logger.error(traceback.format_exc())
+                    raise Exception(error_msg)
+
+            # Refinements in flight are bounded by the pipeline queue, so size it to keep every endpoint busy
+            inflight = deque()
+            pipeline = ChunkPipeline(
+                machine_stage, chunks,
+                maxsize=max(self.pipeline_depth, self.dispatcher.capacity * 2)
+            )
             
-            for i, chunk in enumerate(chunks, 1):
+            for i, chunk, stage_result in pipeline:
                 try:
-                    # Check cache first
-                    cached_result = cache.get_cached_translation(chunk, source_lang, target_lang)
+                    cached_result = stage_result.get('cached')
+                    chunk_span = chunk_spans.pop(i, 0)
+                    source = 'resumed' if stage_result.get('resumed') else 'cached' if cached_result else 'translated'
+                    if monitor is not None:
+                        monitor.chunks.inc(source=source, **self.metric_labels)
                     if cached_result:
                         machine_translations.append(cached_result['machine_translation'])
                         translated_chunks.append(cached_result['translated_text'])
-                        logger.translation_logger.info(f"Cache hit for chunk {i}")
                     else:
-                        # Stage 1: Google Translate
-                        logger.translation_logger.info(f"Translating chunk {i}/{total_chunks}")
-                        google_translation = translator.translate(chunk)
-
-                        logger.translation_logger.info(f"Google translation for chunk {i}: {google_translation}")
-
+                        google_translation = stage_result['machine_translation']
                         machine_translations.append(google_translation)
                         
                         progress = (i / (total_chunks * 2)) * 100
                         yield {
                             'progress': progress,
                             'stage': 'machine_translation',
-                            'machine_translation': '\n\n'.join(machine_translations),
+                            'chunk_index': i,
+                            'machine_translation': google_translation,
                             'current_chunk': i,
                             'total_chunks': total_chunks * 2
                         }
@@ -140,19 +382,37 @@ class BookTranslator:
                             yield {
                                 'progress': progress,
                                 'stage': 'starting_refinement',
-                                'machine_translation': '\n\n'.join(machine_translations),
                                 'current_chunk': i,
                                 'total_chunks': total_chunks * 2,
                                 'refining_chunk': i
                             }
                             
-                            refined_translation = self.refine_translation(google_translation, target_lang)
+                            refinement = stage_result['refinement']
+                            wait_span = trace.begin('refinement_wait', chunk_span)
+                            partial_text = stage_result.get('partial')
+                            if partial_text is not None:
+                                # A chunk assembled from cached paragraphs waits for every run it refines
+                                futures = refinement.futures if isinstance(refinement, _JoinedResult) else [refinement]
+                                shown = ''
+                                while wait(futures, timeout=self.partial_interval).not_done:
+                                    text = partial_text()
+                                    if text != shown:
+                                        shown = text
+                                        yield {
+                                            'progress': progress,
+                                            'stage': 'refinement_partial',
+                                            'chunk_index': i,
+                                            'partial_text': text,
+                                            'current_chunk': i,
+                                            'total_chunks': total_chunks * 2
+                                        }
+                            refined_translation = refinement.result()
+                            trace.end(wait_span)
                             
                             # Add this yield to show that refinement is complete
                             yield {
                                 'progress': progress,
                                 'stage': 'refinement_complete',
-                                'machine_translation': '\n\n'.join(machine_translations),
                                 'current_chunk': i,
                                 'total_chunks': total_chunks * 2,
                                 'refined_chunk': i
@@ -165,61 +425,54 @@ class BookTranslator:
                         translated_chunks.append(refined_translation)
                         
                         # Cache the results
-                        cache.cache_translation(
-                            chunk, refined_translation, google_translation,
-                            source_lang, target_lang
-                        )
+                        with trace.span('cache_store', chunk_span):
+                            cache.cache_translation(
+                                chunk, refined_translation, google_translation,
+                                source_lang, target_lang
+                            )
+                            if cache.segments is not None:
+                                cache.segments.store_chunk(
+                                    chunk, google_translation, refined_translation,
+                                    source_lang, target_lang, skip=stage_result.get('segment_hits', set())
+                                )
                     
                     progress = ((i + total_chunks) / (total_chunks * 2)) * 100
-                    with sqlite3.connect(DB_PATH) as conn:
-                        conn.execute('''
-                            UPDATE translations 
-                            SET progress = ?,
-                                translated_text = ?,
-                                machine_translation = ?,
-                                current_chunk = ?,
-                                updated_at = CURRENT_TIMESTAMP
-                            WHERE id = ?
-                        ''', (
-                            progress,
-                            '\n\n'.join(translated_chunks),
-                            '\n\n'.join(machine_translations),
-                            i + total_chunks,
-                            translation_id
-                        ))
+                    if not stage_result.get('resumed'):
+                        with trace.span('save', chunk_span):
+                            chunk_store.save_chunk(
+                                translation_id, i, chunk,
+                                machine_translations[-1], translated_chunks[-1],
+                                progress, i + total_chunks
+                            )
+                    trace.end(chunk_span, source=source)
                     
-                    yield {
+                    # Events only carry the text of the chunk that just finished
+                    update = {
                         'progress': progress,
                         'stage': 'literary_refinement',
-                        'machine_translation': '\n\n'.join(machine_translations),
-                        'translated_text': '\n\n'.join(translated_chunks),
+                        'chunk_index': i,
+                        'translated_text': translated_chunks[-1],
                         'current_chunk': i + total_chunks,
                         'total_chunks': total_chunks * 2
                     }
+                    if cached_result:
+                        # No machine_translation event was sent for a cache hit
+                        update['machine_translation'] = machine_translations[-1]
+                    yield update
                     
                 except Exception as e:
                     error_msg = f"Error processing chunk {i}: {str(e)}"
                     logger.translation_logger.error(error_msg)
                     logger.translation_logger.error(traceback.format_exc())
                     raise Exception(error_msg)
-                    
-                time.sleep(1)  # Rate limiting
                 
-            # Mark translation as completed
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.execute('''
-                    UPDATE translations 
-                    SET status = 'completed',
-                        progress = 100,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (translation_id,))
+            # Mark translation as completed, writing the full texts only once
+            with trace.span('complete'):
+                chunk_store.complete(translation_id, machine_translations, translated_chunks)
                 
             success = True
             yield {
                 'progress': 100,
-                'machine_translation': '\n\n'.join(machine_translations),
-                'translated_text': '\n\n'.join(translated_chunks),
                 'status': 'completed'
             }
             
@@ -227,8 +480,14 @@ class BookTranslator:
             error_msg = f"Translation failed: {str(e)}"
             logger.translation_logger.error(error_msg)
             logger.translation_logger.error(traceback.format_exc())
+
+            # Chunks finished before the failure must be on disk for a retry to resume from them
+            try:
+                chunk_store.flush(translation_id)
+            except Exception as flush_error:
+                logger.translation_logger.error(f"Failed to save finished chunks: {str(flush_error)}")
             
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.connection() as conn:
                 conn.execute('''
                     UPDATE translations 
                     SET status = 'error',
@@ -238,16 +497,91 @@ class BookTranslator:
                 ''', (str(e), translation_id))
             raise
         finally:
+            if pipeline is not None:
+                pipeline.close()
+                for future in inflight:
+                    future.cancel()
+            if mt_results is not None:
+                # Only after the pipeline thread, which consumes it, has stopped
+                mt_results.close()
             translation_time = time.time() - start_time
             monitor.record_translation_attempt(success, translation_time)
+            if self.tracer is not None:
+                self.tracer.finish(trace, 'completed' if success else 'error')
     
-    def refine_translation(self, text: str, target_lang: str) -> str:
+    def _segment_runs(self, chunk: str, hits: Dict[int, Dict], segment_cache: SegmentCache) -> List[str]:
+        """Return the runs of consecutive paragraphs of a chunk that are not cached."""
+        runs = []
+        run = []
+        for position, segment in enumerate(segment_cache.split(chunk)):
+            if position not in hits:
+                run.append(segment)
+            elif run:
+                runs.append(SEGMENT_SEPARATOR.join(run))
+                run = []
+        if run:
+            runs.append(SEGMENT_SEPARATOR.join(run))
+        return runs
+
+    def _translate_segments(self, chunk: str, hits: Dict[int, Dict], run_translations: List[str],
+                            target_lang: str, segment_cache: SegmentCache,
+                            trace=NULL_TRACE, chunk_span: int = 0) -> Dict:
+        """
+        Refine only the paragraphs of a chunk that are not cached. Each run of
+        consecutive missing paragraphs (see _segment_runs) is machine translated
+        and refined as one piece, and the chunk is reassembled around the
+        cached paragraphs.
+        """
+        machine_parts = []
+        refined_parts = []
+        partials = {}
+        run = []
+        run_translations = iter(run_translations)
+
+        def translate_run():
+            run_translation = next(run_translations)
+            machine_parts.append(run_translation)
+            if self.llm_refine:
+                # Streamed like a whole chunk, one token list per run
+                on_token = partials.setdefault(len(refined_parts), []).append if self.stream_refinement else None
+                refined_parts.append(self.dispatcher.submit(
+                    lambda endpoint: self._traced(
+                        trace, 'refinement', chunk_span, endpoint,
+                        lambda: self.refine_translation(run_translation, target_lang, endpoint.generate_url, on_token)
+                    )
+                ))
+            else:
+                refined_parts.append(run_translation)
+            run.clear()
+
+        for position, segment in enumerate(segment_cache.split(chunk)):
+            if position not in hits:
+                run.append(segment)
+                continue
+            if run:
+                translate_run()
+            machine_parts.append(hits[position]['machine_translation'])
+            refined_parts.append(hits[position]['translated_text' if self.llm_refine else 'machine_translation'])
+        if run:
+            translate_run()
+
+        result = {'machine_translation': SEGMENT_SEPARATOR.join(machine_parts)}
+        if self.llm_refine:
+            result['refinement'] = _JoinedResult(refined_parts, partials)
+            if self.stream_refinement:
+                result['partial'] = result['refinement'].partial_text
+        return result
+
+    def refine_translation(self, text: str, target_lang: str, api_url: Optional[str] = None,
+                           on_token: Optional[Callable[[str], None]] = None) -> str:
         """
         Refine the machine translation strictly in the target language.
         
         Args:
             text (str): The machine-translated text to refine
             target_lang (str): The target language code (e.g., 'en', 'es', 'fr')
+            api_url (str, optional): Ollama generate URL to use instead of the primary endpoint
+            on_token (callable, optional): Called with each piece of text as it is streamed
         
         Returns:
             str: The refined translation
@@ -273,24 +607,131 @@ class BookTranslator:
     
         {text}"""
         
+        return self._generate(prompt, api_url, on_token)
+
+    def revise_translation(self, source_text: str, target_lang: str, match: Dict,
+                           api_url: Optional[str] = None,
+                           on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Adapt the translation of a near-duplicate passage found in the
+        translation memory instead of refining a fresh machine translation.
+
+        Args:
+            source_text (str): The source text of the current chunk
+            target_lang (str): The target language code (e.g., 'en', 'es', 'fr')
+            match (dict): Translation memory match with original_text and translated_text
+            api_url (str, optional): Ollama generate URL to use instead of the primary endpoint
+            on_token (callable, optional): Called with each piece of text as it is streamed
+
+        Returns:
+            str: The edited translation
+        """
+        prompt = f"""The new source text below differs only slightly from a text that was already translated into '{target_lang}'. Edit the previous translation so that it translates the new source text, changing as little as possible. Return only the edited translation.
+
+Previous source text:
+{match['original_text']}
+
+Previous translation:
+{match['translated_text']}
+
+New source text:
+{source_text}"""
+
+        return self._generate(prompt, api_url, on_token)
+
+    def _generate(self, prompt: str, api_url: Optional[str] = None,
+                  on_token: Optional[Callable[[str], None]] = None) -> str:
+        start = time.perf_counter()
+        success = False
+        try:
+            result = self._generate_once(prompt, api_url, on_token)
+            success = True
+            return result
+        finally:
+            self._observe('ollama_refinement', time.perf_counter() - start, success)
+
+    def _generate_once(self, prompt: str, api_url: Optional[str] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> str:
+        if self.stream_refinement:
+            return self._generate_stream(prompt, api_url or self.api_url, on_token)
         payload = {
             "model": self.model_name,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "options": {"num_ctx": self.num_ctx}
         }
         
         response = self.session.post(
-            self.api_url,
+            api_url or self.api_url,
             json=payload,
             timeout=(1800, 1800)
         )
         response.raise_for_status()
         result = response.json()
         return result['response'].strip()
+
+    def _generate_stream(self, prompt: str, api_url: str,
+                         on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Consume Ollama's NDJSON token stream. Until the first token arrives
+        the read timeout is first_token_timeout, which covers loading the
+        model and evaluating the prompt; after that it is stall_timeout,
+        the longest allowed gap between two tokens.
+        """
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "options": {"num_ctx": self.num_ctx}
+        }
+        pieces = []
+        start = time.perf_counter()
+        try:
+            with self.session.post(
+                api_url,
+                json=payload,
+                stream=True,
+                timeout=(10, self.first_token_timeout)
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if 'error' in message:
+                        raise RuntimeError(f"Ollama error: {message['error']}")
+                    piece = message.get('response', '')
+                    if piece:
+                        if not pieces:
+                            self._observe('ollama_first_token', time.perf_counter() - start)
+                            self._set_read_timeout(response, self.stall_timeout)
+                        pieces.append(piece)
+                        if on_token is not None:
+                            on_token(piece)
+                    if message.get('done'):
+                        break
+                else:
+                    raise RuntimeError("Ollama stream ended before the generation was done")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if pieces:
+                # A read timeout in the middle of a stream surfaces as a ConnectionError
+                raise TimeoutError(
+                    f"Generation stalled at {api_url}: no token for {self.stall_timeout}s"
+                ) from e
+            raise
+        return ''.join(pieces).strip()
     
+    @staticmethod
+    def _set_read_timeout(response: requests.Response, seconds: float):
+        # requests applies one read timeout to the whole stream; tighten it on the open socket
+        connection = getattr(response.raw, 'connection', None)
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            sock.settimeout(seconds)
+
     def get_available_models(self) -> List[str]:
         response = self.session.get(
-            "http://localhost:11434/api/tags",
+            self.dispatcher.primary.tags_url,
             timeout=(5, 5)
         )
         response.raise_for_status()
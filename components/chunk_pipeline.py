@@ -0,0 +1,73 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+# Two-stage pipeline setup
+class ChunkPipeline:
+    """
+    Run a producer stage over a sequence of items in a background thread.
+
+    Results are handed to the consumer through a bounded queue, so the producer
+    can run at most `maxsize` items ahead of the consumer. Items are yielded in
+    input order as (index, item, result) tuples, where index starts at 1. If the
+    stage raises for an item, the exception is re-raised in the consumer when
+    that item is reached and the producer stops.
+    """
+
+    _DONE = object()
+
+    def __init__(self, stage: Callable[[int, Any], Any], items: Iterable[Any], maxsize: int = 4,
+                 name: str = 'chunk-pipeline'):
+        self.stage = stage
+        self.items = items
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._started = False
+
+    def _put(self, entry) -> bool:
+        # Block while the queue is full, but give up as soon as the consumer is gone
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for index, item in enumerate(self.items, 1):
+                if self._stop.is_set():
+                    return
+                try:
+                    result = self.stage(index, item)
+                except BaseException as e:
+                    self._put((index, item, None, e))
+                    return
+                if not self._put((index, item, result, None)):
+                    return
+        finally:
+            self._put(self._DONE)
+
+    def __iter__(self) -> Iterator[Tuple[int, Any, Any]]:
+        if not self._started:
+            self._started = True
+            self._thread.start()
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is self._DONE:
+                    return
+                index, item, result, error = entry
+                if error is not None:
+                    raise error
+                yield index, item, result
+        finally:
+            self.close()
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the producer and wait for its thread to exit."""
+        self._stop.set()
+        if self._started and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
@@ -0,0 +1,231 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from components.blob_store import BlobStore
+from components.database import get_database
+from components.write_behind import get_writer
+
+
+DB_PATH = 'db/translations.db' # Define DB_PATH here
+# Full-book columns of a translation row, only loaded when asked for
+TEXT_FIELDS = ('original_text', 'machine_translation', 'translated_text')
+
+# Chunk persistence
+class ChunkStore:
+    """
+    Persist translation results one chunk at a time.
+
+    Each finished chunk is written to the `chunks` table together with the
+    progress fields of its translation, so the bytes written per chunk do not
+    depend on how much of the book is already done. The full texts are only
+    joined when the translation completes or when someone asks for them, and
+    are kept in the blob store; rows only hold the digests.
+
+    Chunk writes go through the database's write-behind writer, so saving a
+    chunk never waits for the disk. Every read of the chunks, and `complete`,
+    flushes the writer first.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, blobs: Optional[BlobStore] = None):
+        self.db_path = db_path
+        self.database = get_database(db_path)
+        self.writer = get_writer(self.database)
+        self.blobs = blobs or BlobStore()
+
+    @staticmethod
+    def source_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def save_chunk(self, translation_id: int, chunk_number: int, original_text: str,
+                   machine_translation: str, translated_text: str, progress: float, current_chunk: int):
+        # The source is already in the blob store; a hash is enough to recognise it on resume
+        self.writer.submit('''
+            INSERT OR REPLACE INTO chunks (
+                translation_id, chunk_number, source_hash,
+                machine_translation, translated_text, status, attempts
+            ) VALUES (?, ?, ?, ?, ?, 'completed', 1)
+        ''', (translation_id, chunk_number, self.source_hash(original_text),
+              machine_translation, translated_text),
+            key=('chunk', translation_id, chunk_number), owner=translation_id)
+        # Only the latest progress of a translation is written
+        self.writer.submit('''
+            UPDATE translations
+            SET progress = ?,
+                current_chunk = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (progress, current_chunk, translation_id), key=('progress', translation_id), owner=translation_id)
+
+    def flush(self, translation_id: Optional[int] = None):
+        """
+        Wait for the chunk writes submitted so far to be committed. With a
+        translation id, raise if any chunk of that translation was not saved.
+        """
+        self.writer.flush(owner=translation_id)
+
+    def assemble(self, translation_id: int) -> Tuple[str, str]:
+        """Join the stored chunks into (machine_translation, translated_text)."""
+        machine_translations = []
+        translated_chunks = []
+        self.flush()
+        with self.database.connection() as conn:
+            cur = conn.execute('''
+                SELECT machine_translation, translated_text
+                FROM chunks
+                WHERE translation_id = ? AND status = 'completed'
+                ORDER BY chunk_number
+            ''', (translation_id,))
+            for machine_translation, translated_text in cur:
+                machine_translations.append(machine_translation)
+                translated_chunks.append(translated_text)
+        return '\n\n'.join(machine_translations), '\n\n'.join(translated_chunks)
+
+    def get_chunks(self, translation_id: int) -> List[Dict]:
+        """Return the finished chunks of a translation in order."""
+        self.flush()
+        with self.database.connection() as conn:
+            cur = conn.execute('''
+                SELECT chunk_number, machine_translation, translated_text
+                FROM chunks
+                WHERE translation_id = ? AND status = 'completed'
+                ORDER BY chunk_number
+            ''', (translation_id,))
+            return [{
+                'index': chunk_number,
+                'machine_translation': machine_translation,
+                'translated_text': translated_text
+            } for chunk_number, machine_translation, translated_text in cur]
+
+    def get_completed_chunks(self, translation_id: int, chunks: List[str]) -> Dict[int, Dict]:
+        """
+        Return the stored results that can be reused for `chunks`, keyed by
+        chunk number. Stored chunks whose source text no longer matches (for
+        example after a chunking change) are deleted instead.
+        """
+        completed = {}
+        stale = []
+        self.flush()
+        with self.database.connection() as conn:
+            cur = conn.execute('''
+                SELECT chunk_number, source_hash, original_text, machine_translation, translated_text, status
+                FROM chunks
+                WHERE translation_id = ?
+            ''', (translation_id,))
+            for chunk_number, source_hash, original_text, machine_translation, translated_text, status in cur.fetchall():
+                if status == 'completed' and 1 <= chunk_number <= len(chunks) \
+                        and self._matches(chunks[chunk_number - 1], source_hash, original_text):
+                    completed[chunk_number] = {
+                        'machine_translation': machine_translation,
+                        'translated_text': translated_text
+                    }
+                else:
+                    stale.append((translation_id, chunk_number))
+            if stale:
+                conn.executemany('''
+                    DELETE FROM chunks
+                    WHERE translation_id = ? AND chunk_number = ?
+                ''', stale)
+        return completed
+
+    def _matches(self, chunk: str, source_hash: Optional[str], original_text: Optional[str]) -> bool:
+        # Chunks saved before source hashes were introduced still carry their text
+        if source_hash is None:
+            return chunk == original_text
+        return self.source_hash(chunk) == source_hash
+
+    def final_chunks(self, translation_id: int) -> List[Dict]:
+        """
+        Return the texts of a completed translation as a single chunk. Its
+        chunk rows are deleted on completion, so they come from the blob store.
+        """
+        translated_blob = self.translated_blob(translation_id)
+        if translated_blob is None:
+            return []
+        with self.database.connection() as conn:
+            row = conn.execute('''
+                SELECT machine_translation_blob
+                FROM translations
+                WHERE id = ?
+            ''', (translation_id,)).fetchone()
+        return [{
+            'index': 1,
+            'machine_translation': self.blobs.read_text(row[0]),
+            'translated_text': self.blobs.read_text(translated_blob)
+        }]
+
+    def complete(self, translation_id: int, machine_translations: List[str], translated_chunks: List[str]):
+        """
+        Store the final texts as blobs, mark the translation as completed and
+        drop its chunk rows, which the blobs now hold.
+        """
+        # Progress still queued must not land after the completed status, and lost chunks fail the job
+        self.flush(translation_id)
+        machine_translation_blob = self.blobs.put_text(machine_translations, '\n\n')
+        translated_blob = self.blobs.put_text(translated_chunks, '\n\n')
+        with self.database.connection() as conn:
+            conn.execute('''
+                UPDATE translations
+                SET status = 'completed',
+                    progress = 100,
+                    machine_translation = NULL,
+                    translated_text = NULL,
+                    machine_translation_blob = ?,
+                    translated_blob = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (machine_translation_blob, translated_blob, translation_id))
+            conn.execute('''
+                DELETE FROM chunks
+                WHERE translation_id = ?
+            ''', (translation_id,))
+
+    def translated_blob(self, translation_id: int) -> Optional[str]:
+        """
+        Return the digest of a completed translation's text. Rows written
+        before the blob store are moved into it on first use, so the file is
+        written once and every later download reads the same blob.
+        """
+        with self.database.connection() as conn:
+            row = conn.execute('''
+                SELECT translated_blob, machine_translation, translated_text
+                FROM translations
+                WHERE id = ? AND status = 'completed'
+            ''', (translation_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0]:
+                return row[0]
+            machine_translation, translated_text = row[1] or '', row[2] or ''
+            machine_translation_blob = self.blobs.put_text([machine_translation])
+            translated_blob = self.blobs.put_text([translated_text])
+            conn.execute('''
+                UPDATE translations
+                SET machine_translation = NULL,
+                    translated_text = NULL,
+                    machine_translation_blob = ?,
+                    translated_blob = ?
+                WHERE id = ?
+            ''', (machine_translation_blob, translated_blob, translation_id))
+        return translated_blob
+
+    def fill_texts(self, translation: Dict, fields: Iterable[str] = TEXT_FIELDS) -> Dict:
+        """
+        Load the requested texts of a translation row from the blob store, or
+        assemble them from its chunks while it is unfinished. Rows written
+        before the blob store keep their texts inline and are returned as they are.
+        """
+        fields = set(fields)
+        if 'original_text' in fields and translation.get('original_blob'):
+            translation['original_text'] = self.blobs.read_text(
+                translation['original_blob'], translation.get('original_encoding') or 'utf-8'
+            )
+        if not fields & {'machine_translation', 'translated_text'}:
+            return translation
+        if translation.get('status') != 'completed':
+            machine_translation, translated_text = self.assemble(translation['id'])
+            translation['machine_translation'] = machine_translation
+            translation['translated_text'] = translated_text
+        elif translation.get('translated_blob'):
+            translation['machine_translation'] = self.blobs.read_text(translation['machine_translation_blob'])
+            translation['translated_text'] = self.blobs.read_text(translation['translated_blob'])
+        return translation
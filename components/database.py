@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+DB_PATH = 'db/translations.db' # Define DB_PATH here
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Database setup
+class Database:
+    """
+    Pool of SQLite connections to one database file.
+
+    Every connection is opened with the same pragmas: WAL journaling, so
+    readers never wait for a writer and a commit appends to the log instead
+    of rewriting pages; a busy timeout, so a writer waits for the lock
+    instead of failing with `database is locked`; and the configured
+    `synchronous` and `mmap_size`. Connections go back to the pool after use
+    and keep their cache of prepared statements, so a statement run once per
+    chunk is only compiled once per connection.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = 8, busy_timeout: float = 5.0,
+                 synchronous: str = 'NORMAL', mmap_size: int = 256 * 1024 * 1024,
+                 cached_statements: int = 256):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}, got {synchronous}")
+        self.path = path
+        self.pool_size = pool_size # idle connections kept open
+        self.busy_timeout = busy_timeout # seconds a statement waits for a lock
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size # bytes of the file read through mmap
+        self.cached_statements = cached_statements # prepared statements kept per connection
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'reused': 0, 'closed': 0}
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection with the pool's pragmas, outside the pool."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection for one transaction, committed when the block
+        ends and rolled back if it raises, like `with sqlite3.connect(...)`.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats['reused' if conn is not None else 'opened'] += 1
+        if conn is None:
+            conn = self.connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            with self._lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append(conn)
+                    conn = None
+                else:
+                    self._stats['closed'] += 1
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle))
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str = DB_PATH, **options) -> Database:
+    """
+    Return the shared Database for `path`, creating it on first use. Options
+    only apply to that first call, so configure it before the components
+    that use it are created.
+    """
+    key = os.path.abspath(path)
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None:
+            database = _databases[key] = Database(path, **options)
+        return database
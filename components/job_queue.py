@@ -0,0 +1,188 @@
+import queue
+import sqlite3
+import threading
+import traceback
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from components.database import get_database
+
+
+DB_PATH = 'db/translations.db' # Define DB_PATH here
+
+_CLOSED = object()
+
+# Job event subscription
+class JobSubscription:
+    """Events of one job as seen by one client, ending after the job does."""
+
+    def __init__(self, hub: 'TranslationJobQueue', translation_id: int):
+        self.hub = hub
+        self.translation_id = translation_id
+        self._queue = queue.Queue()
+
+    def put(self, event):
+        self._queue.put(event)
+
+    def __iter__(self) -> Iterator[Dict]:
+        try:
+            while True:
+                event = self._queue.get()
+                if event is _CLOSED:
+                    return
+                yield event
+        finally:
+            self.close()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+        # Ends an iteration blocked in another thread, such as the source thread of a rate-limited stream
+        self._queue.put(_CLOSED)
+
+
+# Translation job queue setup
+class TranslationJobQueue:
+    """
+    Run translations from the `translations` table on a fixed pool of workers.
+
+    A job is any row with status 'pending'. Workers claim the oldest one by
+    switching it to 'in_progress', run it to the end whether or not anyone is
+    watching, and publish every progress event to the job's subscribers.
+    Rows left 'in_progress' by a previous process are queued again on start.
+    """
+
+    def __init__(self, runner: Callable[[int], Iterable[Dict]], db_path: str = DB_PATH,
+                 workers: int = 2, poll_interval: float = 5.0, logger=None):
+        self.runner = runner
+        self.db_path = db_path
+        self.database = get_database(db_path)
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self._wakeup = threading.Condition()
+        self._pending_wakeups = 0
+        self._subscribers: Dict[int, List[JobSubscription]] = {}
+        self._subscribers_lock = threading.Lock()
+        self._active = set()
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        with self.database.connection() as conn:
+            cur = conn.execute('''
+                UPDATE translations
+                SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'in_progress'
+            ''')
+            if cur.rowcount and self.logger:
+                self.logger.app_logger.info(f"Re-queued {cur.rowcount} interrupted translations")
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'translation-worker-{n + 1}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.notify(self.workers)
+
+    def notify(self, count: int = 1):
+        """Wake idle workers after new jobs were queued."""
+        with self._wakeup:
+            self._pending_wakeups += count
+            self._wakeup.notify(count)
+
+    def is_active(self, translation_id: int) -> bool:
+        return translation_id in self._active
+
+    def _claim(self) -> Optional[int]:
+        with self.database.connection() as conn:
+            while True:
+                row = conn.execute('''
+                    SELECT id FROM translations
+                    WHERE status = 'pending'
+                    ORDER BY id
+                    LIMIT 1
+                ''').fetchone()
+                if row is None:
+                    return None
+                cur = conn.execute('''
+                    UPDATE translations
+                    SET status = 'in_progress', updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'pending'
+                ''', (row[0],))
+                conn.commit()
+                if cur.rowcount == 1:
+                    return row[0]
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                translation_id = self._claim()
+            except sqlite3.Error as e:
+                if self.logger:
+                    self.logger.app_logger.error(f"Failed to claim translation job: {str(e)}")
+                translation_id = None
+            if translation_id is None:
+                with self._wakeup:
+                    if not self._pending_wakeups:
+                        self._wakeup.wait(self.poll_interval)
+                    self._pending_wakeups = max(0, self._pending_wakeups - 1)
+                continue
+            self._run(translation_id)
+
+    def _run(self, translation_id: int):
+        self._active.add(translation_id)
+        try:
+            if self.logger:
+                self.logger.translation_logger.info(f"Worker picked up translation {translation_id}")
+            for event in self.runner(translation_id):
+                self.publish(translation_id, event)
+        except Exception as e:
+            if self.logger:
+                self.logger.translation_logger.error(f"Translation job {translation_id} failed: {str(e)}")
+                self.logger.translation_logger.error(traceback.format_exc())
+            self._fail(translation_id, str(e))
+            self.publish(translation_id, {'error': str(e)})
+        finally:
+            self._active.discard(translation_id)
+            self._close_subscribers(translation_id)
+
+    def _fail(self, translation_id: int, error_message: str):
+        # A runner that fails before its own error handling would leave the row to be re-queued on every start
+        try:
+            with self.database.connection() as conn:
+                conn.execute('''
+                    UPDATE translations
+                    SET status = 'error',
+                        error_message = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'in_progress'
+                ''', (error_message, translation_id))
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.translation_logger.error(f"Failed to mark translation {translation_id} as failed: {str(e)}")
+
+    def subscribe(self, translation_id: int) -> JobSubscription:
+        subscription = JobSubscription(self, translation_id)
+        with self._subscribers_lock:
+            self._subscribers.setdefault(translation_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: JobSubscription):
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(subscription.translation_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.translation_id, None)
+
+    def publish(self, translation_id: int, event: Dict):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.get(translation_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def _close_subscribers(self, translation_id: int):
+        with self._subscribers_lock:
+            subscribers = self._subscribers.pop(translation_id, [])
+        for subscription in subscribers:
+            subscription.put(_CLOSED)
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import requests
+from bs4 import BeautifulSoup
+from deep_translator.constants import BASE_URLS, GOOGLE_LANGUAGES_TO_CODES
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+
+from components.rate_limiter import RateLimiter
+
+MAX_REQUEST_CHARS = 4500  # Google Translate limit
+
+# Packed texts are joined with a marker line that machine translation leaves alone
+PACK_SEPARATOR = '\n\n###\n\n'
+_PACK_SPLIT = re.compile(r'\s*###\s*')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ServerError(RequestError):
+    """A 5xx answer from the translation server, which is worth retrying."""
+
+
+def shared_session(pool_size: int = 16) -> requests.Session:
+    """One pooled HTTP session for every machine translation request."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount('https://', requests.adapters.HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=pool_size
+            ))
+        return _session
+
+
+# Machine translation backend interface
+class MachineTranslator:
+    """
+    A machine translation backend for one language pair.
+
+    `translate_batch` receives consecutive texts whose combined length fits in
+    `max_chars` and returns their translations in the same order. Backends
+    that cannot translate several texts in one request simply loop.
+    """
+
+    max_chars = MAX_REQUEST_CHARS
+
+    def translate(self, text: str) -> str:
+        raise NotImplementedError
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        return [self.translate(text) for text in texts]
+
+
+# Google Translate backend
+class GoogleMachineTranslator(MachineTranslator):
+    """
+    Google Translate over a pooled session, throttled by a shared RateLimiter.
+
+    Requests and parsing follow deep_translator's GoogleTranslator, which
+    opens a new connection per call and is not safe to share between threads.
+    A batch is sent as one request with the texts joined by PACK_SEPARATOR;
+    if the markers do not survive translation, each text is sent on its own.
+    """
+
+    def __init__(self, source: str = 'auto', target: str = 'en',
+                 session: Optional[requests.Session] = None, limiter: Optional[RateLimiter] = None,
+                 url: Optional[str] = None):
+        self.source = GOOGLE_LANGUAGES_TO_CODES.get(source, source)
+        self.target = GOOGLE_LANGUAGES_TO_CODES.get(target, target)
+        self.url = url or BASE_URLS['GOOGLE_TRANSLATE'] # any server answering like translate.google.com/m
+        self.session = session or shared_session()
+        self.limiter = limiter or RateLimiter(name='google')
+
+    def _request(self, text: str) -> str:
+        response = self.session.get(
+            self.url,
+            params={'tl': self.target, 'sl': self.source, 'q': text},
+            timeout=(10, 60)
+        )
+        if response.status_code == 429:
+            raise TooManyRequests()
+        if response.status_code >= 500:
+            raise ServerError()
+        if response.status_code < 200 or response.status_code > 299:
+            # Other client errors fail the same way on every attempt
+            raise RequestError()
+        soup = BeautifulSoup(response.text, 'html.parser')
+        element = soup.find('div', {'class': 't0'}) or soup.find('div', {'class': 'result-container'})
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+    def translate(self, text: str) -> str:
+        text = text.strip()
+        if not text or self.source == self.target:
+            return text
+        return self.limiter.call(
+            lambda: self._request(text),
+            lambda e: isinstance(e, (TooManyRequests, ServerError))
+        )
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        if len(texts) == 1:
+            return [self.translate(texts[0])]
+        parts = _PACK_SPLIT.split(self.translate(PACK_SEPARATOR.join(text.strip() for text in texts)))
+        if len(parts) != len(texts):
+            return super().translate_batch(texts)
+        return parts
+
+
+# Machine translation stage setup
+class MachineTranslationStage:
+    """
+    Translate a sequence of texts concurrently, yielding results in order.
+
+    Consecutive texts are packed into batches of at most `backend.max_chars`
+    characters; up to `workers` batches are in flight at once, and results
+    are handed out in input order, so the stage can run ahead of a consumer
+    that takes one text at a time.
+    """
+
+    def __init__(self, backend: MachineTranslator, workers: int = 8,
+                 observe: Optional[Callable[[float, bool], None]] = None):
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.observe = observe # called with the seconds and success of every request
+
+    def _translate_batch(self, batch: List[str]) -> List[str]:
+        start = time.perf_counter()
+        success = False
+        try:
+            result = self.backend.translate_batch(batch)
+            success = True
+            return result
+        finally:
+            if self.observe is not None:
+                self.observe(time.perf_counter() - start, success)
+
+    def pack(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        batch = []
+        size = 0
+        for text in texts:
+            added = len(text) + len(PACK_SEPARATOR)
+            if batch and size + added > self.backend.max_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += added
+        if batch:
+            yield batch
+
+    def map(self, texts: Iterable[str]) -> Iterator[str]:
+        window = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='machine-translation')
+        try:
+            for batch in self.pack(texts):
+                window.append(executor.submit(self._translate_batch, batch))
+                if len(window) >= self.workers:
+                    yield from window.popleft().result()
+            while window:
+                yield from window.popleft().result()
+        finally:
+            for future in window:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,105 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; wide enough for a cache lookup and for a refinement on a slow GPU
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Series:
+    __slots__ = ('lock', 'counts', 'sum')
+
+    def __init__(self, size: int):
+        self.lock = threading.Lock()
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+# Metric families setup
+class Histogram:
+    """
+    Fixed-bucket histogram family in the Prometheus data model.
+
+    Each label combination is a series with its own lock, so recording only
+    contends with other observations of the same series and costs a bisect
+    over the bucket bounds. The family lock is only taken to add a series.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, labels: Labels) -> _Series:
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, _Series(len(self.buckets) + 1))
+        return series
+
+    def observe(self, value: float, **labels):
+        series = self._get(tuple(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+
+    def snapshot(self) -> Dict[Labels, Tuple[List[int], float]]:
+        with self._lock:
+            items = list(self._series.items())
+        result = {}
+        for labels, series in items:
+            with series.lock:
+                result[labels] = (list(series.counts), series.sum)
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter family, one value per label combination."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.items())
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in self.snapshot().items():
+            lines.append(f'{self.name}{format_labels(labels)} {value}')
+        return lines
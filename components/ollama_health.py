@@ -0,0 +1,124 @@
+import threading
+import time
+import requests
+from typing import Dict, List, Optional
+
+from components.ollama_pool import OllamaEndpoint
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Circuit breaker setup
+class CircuitBreaker:
+    """
+    Track the health of one endpoint.
+
+    The breaker opens after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds have passed it becomes half-open and lets one
+    trial through: success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            return self.state != OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+# Ollama liveness probe
+class OllamaHealthMonitor:
+    """
+    Probe every Ollama endpoint from a background thread and cache the result.
+
+    Request handlers only read `available`, which is recomputed after each
+    probe round, so checking it never touches the network.
+    """
+
+    def __init__(self, endpoints: List[OllamaEndpoint], interval: float = 10.0, timeout: float = 5.0,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0, logger=None):
+        self.endpoints = endpoints
+        self.interval = interval
+        self.timeout = timeout
+        self.logger = logger
+        self.breakers = {
+            endpoint.url: CircuitBreaker(failure_threshold, reset_timeout) for endpoint in endpoints
+        }
+        self.session = requests.Session()
+        # Optimistic until the first probe round says otherwise
+        self.available = True
+        self.last_probe = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_available(self) -> bool:
+        return self.available
+
+    def probe(self):
+        """Run one probe round over all endpoints whose breaker allows it."""
+        for endpoint in self.endpoints:
+            breaker = self.breakers[endpoint.url]
+            if not breaker.allow_request():
+                continue
+            try:
+                response = self.session.get(endpoint.tags_url, timeout=self.timeout)
+                response.raise_for_status()
+                breaker.record_success()
+            except requests.exceptions.RequestException as e:
+                breaker.record_failure(str(e))
+                if self.logger:
+                    self.logger.app_logger.error(f"Ollama health check failed for {endpoint.url}: {str(e)}")
+        self.available = any(breaker.state != OPEN for breaker in self.breakers.values())
+        self.last_probe = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe()
+            except Exception as e:
+                if self.logger:
+                    self.logger.app_logger.error(f"Ollama probe error: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ollama-probe', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_status(self) -> Dict:
+        return {
+            'available': self.available,
+            'last_probe': self.last_probe,
+            'endpoints': [{
+                'url': url,
+                'state': breaker.state,
+                'failures': breaker.failures,
+                'last_error': breaker.last_error
+            } for url, breaker in self.breakers.items()]
+        }
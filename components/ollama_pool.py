@@ -0,0 +1,163 @@
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from components.rate_limiter import RateLimiter
+
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+
+@dataclass
+class OllamaEndpoint:
+    url: str
+    max_concurrency: int = 1
+    outstanding: int = 0
+    completed: int = 0
+    failed: int = 0
+    limiter: Optional[RateLimiter] = field(default=None, repr=False)
+
+    @property
+    def generate_url(self) -> str:
+        return f"{self.url}/api/generate"
+
+    @property
+    def tags_url(self) -> str:
+        return f"{self.url}/api/tags"
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.max_concurrency
+
+
+def parse_endpoints(spec: str, default_concurrency: int = 1) -> List[OllamaEndpoint]:
+    """
+    Parse a comma-separated endpoint list such as
+    "http://gpu1:11434|2,http://gpu2:11434", where the optional "|n" suffix is
+    the number of concurrent requests that endpoint accepts.
+    """
+    endpoints = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, concurrency = entry.partition('|')
+        endpoints.append(OllamaEndpoint(
+            url=url.strip().rstrip('/'),
+            max_concurrency=max(1, int(concurrency) if concurrency.strip() else default_concurrency)
+        ))
+    if not endpoints:
+        endpoints.append(OllamaEndpoint(url=DEFAULT_OLLAMA_URL, max_concurrency=default_concurrency))
+    return endpoints
+
+
+def is_overloaded(error: Exception) -> bool:
+    """True for the HTTP errors that mean the server wants less traffic (429 and 5xx)."""
+    response = getattr(error, 'response', None)
+    return isinstance(error, requests.HTTPError) and response is not None \
+        and (response.status_code == 429 or response.status_code >= 500)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+# Refinement dispatcher setup
+class RefinementDispatcher:
+    """
+    Spread refinement requests over a pool of Ollama endpoints.
+
+    Each task is routed to the endpoint with the fewest outstanding requests
+    relative to its concurrency limit, and waits while every endpoint is at its
+    limit. `submit` returns a Future, so callers keep chunk order simply by
+    collecting futures in the order they were submitted.
+
+    Every endpoint also has a RateLimiter (`rate` requests per second, None
+    for no limit) that backs off when the endpoint answers 429 or 5xx.
+    """
+
+    def __init__(self, endpoints: Optional[List[OllamaEndpoint]] = None,
+                 rate: Optional[float] = None, burst: int = 1):
+        self.endpoints = endpoints or [OllamaEndpoint(url=DEFAULT_OLLAMA_URL)]
+        for endpoint in self.endpoints:
+            if endpoint.limiter is None:
+                endpoint.limiter = RateLimiter(rate, burst, name=endpoint.url)
+        self.capacity = sum(endpoint.max_concurrency for endpoint in self.endpoints)
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(
+            max_retries=3,
+            pool_connections=len(self.endpoints),
+            pool_maxsize=max(10, self.capacity)
+        ))
+        self._cond = threading.Condition()
+        self._executor = None
+
+    @property
+    def primary(self) -> OllamaEndpoint:
+        return self.endpoints[0]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.capacity,
+                    thread_name_prefix='ollama-refine'
+                )
+            return self._executor
+
+    def _acquire(self) -> OllamaEndpoint:
+        with self._cond:
+            while True:
+                available = [e for e in self.endpoints if e.outstanding < e.max_concurrency]
+                if available:
+                    endpoint = min(available, key=lambda e: (e.load, e.outstanding))
+                    endpoint.outstanding += 1
+                    return endpoint
+                self._cond.wait()
+
+    def _release(self, endpoint: OllamaEndpoint, success: bool):
+        with self._cond:
+            endpoint.outstanding -= 1
+            if success:
+                endpoint.completed += 1
+            else:
+                endpoint.failed += 1
+            self._cond.notify()
+
+    def run(self, fn: Callable[[OllamaEndpoint], str]) -> str:
+        """Run fn on the least loaded endpoint in the calling thread."""
+        endpoint = self._acquire()
+        success = False
+        try:
+            result = endpoint.limiter.call(
+                lambda: fn(endpoint), is_overloaded, retry_after=retry_after
+            )
+            success = True
+            return result
+        finally:
+            self._release(endpoint, success)
+
+    def submit(self, fn: Callable[[OllamaEndpoint], str]) -> Future:
+        """Schedule fn(endpoint) on the worker pool."""
+        return self._get_executor().submit(self.run, fn)
+
+    def get_stats(self) -> List[Dict]:
+        with self._cond:
+            return [{
+                'url': endpoint.url,
+                'max_concurrency': endpoint.max_concurrency,
+                'outstanding': endpoint.outstanding,
+                'completed': endpoint.completed,
+                'failed': endpoint.failed,
+                'rate_limit': endpoint.limiter.get_stats()
+            } for endpoint in self.endpoints]
+
+    def shutdown(self):
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
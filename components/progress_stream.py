@@ -0,0 +1,211 @@
+import json
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+PROTOCOL_V1 = 'v1'
+PROTOCOL_V2 = 'v2'
+
+# Fields shared by every progress event; a coalesced event keeps the latest values
+_STATUS_FIELDS = ('progress', 'stage', 'current_chunk', 'total_chunks', 'refining_chunk', 'refined_chunk',
+                  'cached_chunks', 'resumed_chunks', 'status')
+_TEXT_FIELDS = ('machine_translation', 'translated_text', 'partial_text')
+
+
+def encode_sse(event: Dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+# Legacy (v1) stream setup
+class LegacyProgressAdapter:
+    """
+    Rebuild the original full-text events from the per-chunk events of
+    BookTranslator.translate_text. Every v1 event repeats the whole text
+    translated so far, so this is only used when a client asks for it.
+    """
+
+    def __init__(self, machine_translations: Optional[List[str]] = None,
+                 translated_chunks: Optional[List[str]] = None):
+        self.machine_translations = machine_translations or []
+        self.translated_chunks = translated_chunks or []
+
+    def convert(self, event: Dict) -> Optional[Dict]:
+        if 'error' in event:
+            return event
+        if event.get('status') == 'completed':
+            return {
+                'progress': event['progress'],
+                'machine_translation': '\n\n'.join(self.machine_translations),
+                'translated_text': '\n\n'.join(self.translated_chunks),
+                'status': 'completed'
+            }
+
+        stage = event.get('stage')
+        if stage == 'snapshot':
+            # Chunks finished before the client subscribed
+            for chunk in event['chunks']:
+                self.machine_translations.append(chunk['machine_translation'])
+                self.translated_chunks.append(chunk['translated_text'])
+            stage = 'literary_refinement'
+        elif 'machine_translation' in event:
+            self.machine_translations.append(event['machine_translation'])
+        if stage == 'literary_refinement':
+            if 'translated_text' in event:
+                self.translated_chunks.append(event['translated_text'])
+            return {
+                'progress': event['progress'],
+                'stage': stage,
+                'machine_translation': '\n\n'.join(self.machine_translations),
+                'translated_text': '\n\n'.join(self.translated_chunks),
+                'current_chunk': event['current_chunk'],
+                'total_chunks': event['total_chunks']
+            }
+        if stage in ('machine_translation', 'starting_refinement', 'refinement_complete'):
+            legacy = {
+                'progress': event['progress'],
+                'stage': stage,
+                'machine_translation': '\n\n'.join(self.machine_translations),
+                'current_chunk': event['current_chunk'],
+                'total_chunks': event['total_chunks']
+            }
+            for key in ('refining_chunk', 'refined_chunk'):
+                if key in event:
+                    legacy[key] = event[key]
+            return legacy
+        # Event types that did not exist in v1 are not forwarded
+        return None
+
+
+# Delta (v2) stream setup
+class DeltaEventCoalescer:
+    """
+    Turn engine events into v2 events and merge them so that at most
+    `max_per_second` are emitted. Status fields keep their latest value and
+    chunk texts are collected in a `chunks` list, so no text is ever dropped.
+    Terminal events (completion or error) are never held back.
+    """
+
+    def __init__(self, max_per_second: Optional[float] = None):
+        self.interval = 1.0 / max_per_second if max_per_second else 0.0
+        self._pending = None
+        self._last_emit = 0.0
+
+    @staticmethod
+    def to_delta(event: Dict) -> Dict:
+        if 'error' in event:
+            return dict(event)
+        delta = {key: event[key] for key in _STATUS_FIELDS if key in event}
+        texts = {key: event[key] for key in _TEXT_FIELDS if key in event}
+        chunks = [dict(chunk) for chunk in event.get('chunks', ())]
+        if 'chunk_index' in event and texts:
+            chunks.append(dict(index=event['chunk_index'], **texts))
+        if chunks:
+            delta['chunks'] = chunks
+        return delta
+
+    def _merge(self, delta: Dict):
+        if self._pending is None:
+            self._pending = delta
+            return
+        pending_chunks = self._pending.pop('chunks', [])
+        by_index = {chunk['index']: chunk for chunk in pending_chunks}
+        for chunk in delta.pop('chunks', []):
+            if chunk['index'] in by_index:
+                if 'translated_text' in chunk:
+                    # The final text supersedes any partial refinement still pending
+                    by_index[chunk['index']].pop('partial_text', None)
+                by_index[chunk['index']].update(chunk)
+            else:
+                by_index[chunk['index']] = chunk
+                pending_chunks.append(chunk)
+        self._pending.update(delta)
+        if pending_chunks:
+            self._pending['chunks'] = pending_chunks
+
+    def push(self, event: Dict, now: Optional[float] = None) -> Optional[Dict]:
+        """Add an event and return an event to emit now, if any."""
+        self._merge(self.to_delta(event))
+        terminal = 'error' in event or event.get('status') == 'completed'
+        if terminal or self.timeout(now) == 0:
+            return self.flush(now)
+        return None
+
+    def timeout(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the pending event is due, or None if nothing is pending."""
+        if self._pending is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._last_emit + self.interval - now)
+
+    def flush(self, now: Optional[float] = None) -> Optional[Dict]:
+        event, self._pending = self._pending, None
+        if event is not None:
+            self._last_emit = time.monotonic() if now is None else now
+        return event
+
+
+def _iter_in_thread(events: Iterable[Dict], stop: threading.Event, buffer: queue.Queue):
+    source = iter(events)
+    try:
+        for event in source:
+            buffer.put(event)
+            if stop.is_set():
+                break
+    except Exception as e:
+        buffer.put(e)
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+        buffer.put(StopIteration)
+
+
+def stream_events(events: Iterable[Dict], protocol: str = PROTOCOL_V2,
+                  max_per_second: Optional[float] = None) -> Iterator[str]:
+    """
+    Encode engine events as SSE messages in the requested protocol.
+
+    v1 reproduces the original full-text events. v2 sends only the text of
+    new chunks and, with max_per_second, coalesces events; the engine then
+    runs in a helper thread so a held-back event is flushed on time even
+    while the next chunk is still being refined.
+    """
+    if protocol == PROTOCOL_V1:
+        adapter = LegacyProgressAdapter()
+        for event in events:
+            legacy = adapter.convert(event)
+            if legacy is not None:
+                yield encode_sse(legacy)
+        return
+
+    coalescer = DeltaEventCoalescer(max_per_second)
+    if not max_per_second:
+        for event in events:
+            yield encode_sse(coalescer.push(event))
+        return
+
+    stop = threading.Event()
+    buffer = queue.Queue()
+    worker = threading.Thread(target=_iter_in_thread, args=(events, stop, buffer),
+                              name='sse-source', daemon=True)
+    worker.start()
+    try:
+        while True:
+            try:
+                item = buffer.get(timeout=coalescer.timeout())
+            except queue.Empty:
+                yield encode_sse(coalescer.flush())
+                continue
+            if item is StopIteration:
+                break
+            if isinstance(item, Exception):
+                raise item
+            ready = coalescer.push(item)
+            if ready is not None:
+                yield encode_sse(ready)
+        pending = coalescer.flush()
+        if pending is not None:
+            yield encode_sse(pending)
+    finally:
+        stop.set()
@@ -0,0 +1,111 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Rate limiter setup
+class RateLimiter:
+    """
+    Token bucket for the outbound calls to one backend.
+
+    The bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second; every call takes one token, so short bursts go out at once while
+    the long-run rate stays at `rate`. A `rate` of None only applies backoff.
+
+    When the backend answers with 429 or a 5xx, `backoff` halves the current
+    rate (down to `min_rate`) and pauses the bucket, doubling the pause on
+    consecutive failures. Each success afterwards raises the rate again in
+    steps of a tenth of the configured rate until it is fully recovered.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1, min_rate: Optional[float] = None,
+                 max_pause: float = 60.0, name: str = ''):
+        self.rate = rate if rate and rate > 0 else None
+        self.burst = max(1, burst)
+        self.min_rate = min_rate if min_rate is not None else (self.rate / 10 if self.rate else None)
+        self.max_pause = max_pause
+        self.name = name
+
+        self.current_rate = self.rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'throttled': 0, 'waited': 0.0}
+
+    def _refill(self, now: float):
+        if self.current_rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.current_rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until the next call may go out. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.current_rate is None or self._tokens >= 1:
+                    if self.current_rate is not None:
+                        self._tokens -= 1
+                    self._stats['calls'] += 1
+                    self._stats['waited'] += waited
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.current_rate
+            time.sleep(delay)
+            waited += delay
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            if self.rate is not None and self.current_rate < self.rate:
+                self.current_rate = min(self.rate, self.current_rate + self.rate / 10)
+
+    def backoff(self, retry_after: Optional[float] = None):
+        """Slow down after the backend signalled overload."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._failures += 1
+            self._stats['throttled'] += 1
+            if self.current_rate is not None:
+                self.current_rate = max(self.min_rate, self.current_rate / 2)
+                self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 2 ** (self._failures - 1)
+            self._paused_until = max(self._paused_until, now + min(pause, self.max_pause))
+
+    def call(self, fn: Callable[[], T], is_throttled: Callable[[Exception], bool],
+             retries: int = 3, retry_after: Optional[Callable[[Exception], Optional[float]]] = None) -> T:
+        """
+        Run fn once a token is available. Failures for which is_throttled is
+        true back the limiter off and are retried up to `retries` times.
+        """
+        for attempt in range(retries + 1):
+            self.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt == retries or not is_throttled(e):
+                    raise
+                self.backoff(retry_after(e) if retry_after else None)
+                continue
+            self.success()
+            return result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'rate': self.rate,
+                'current_rate': self.current_rate,
+                'burst': self.burst,
+                'paused_for': max(0.0, self._paused_until - time.monotonic()),
+                'calls': self._stats['calls'],
+                'throttled': self._stats['throttled'],
+                'waited': round(self._stats['waited'], 3)
+            }
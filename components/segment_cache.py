@@ -0,0 +1,122 @@
+import hashlib
+import re
+from typing import Dict, List, Set
+
+from components.database import Database
+from components.write_behind import WriteBehindWriter
+
+SEGMENT_SEPARATOR = '\n\n'
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Segment cache setup
+class SegmentCache:
+    """
+    Cache of translated segments (paragraphs) beneath the chunk cache.
+
+    Chunks are joined from paragraphs with a blank line, so a chunk that misses
+    the chunk cache can still be assembled from the paragraphs it shares with
+    earlier runs, and only the paragraphs that changed need translating.
+    Segments are keyed on their whitespace-normalised text, and stored through
+    the cache's write-behind writer.
+    """
+
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, database: Database, writer: WriteBehindWriter):
+        self.database = database
+        self.writer = writer
+        with self.database.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS segment_cache (
+                    hash_key TEXT PRIMARY KEY,
+                    source_lang TEXT,
+                    target_lang TEXT,
+                    segment TEXT,
+                    machine_translation TEXT,
+                    translated_text TEXT,
+                    created_at TIMESTAMP
+                )
+            ''')
+
+    @staticmethod
+    def split(chunk: str) -> List[str]:
+        return chunk.split(SEGMENT_SEPARATOR)
+
+    @staticmethod
+    def normalize(segment: str) -> str:
+        return _WHITESPACE.sub(' ', segment).strip()
+
+    def _generate_hash(self, segment: str, source_lang: str, target_lang: str) -> str:
+        key = f"{segment}:{source_lang}:{target_lang}".encode('utf-8')
+        return hashlib.sha256(key).hexdigest()
+
+    def lookup(self, segments: List[str], source_lang: str, target_lang: str) -> Dict[int, Dict[str, str]]:
+        """
+        Return the cached segments keyed by their position in `segments`.
+        Blank segments are never returned: they are not cached, and counting
+        them as hits would make chunks look partly cached when nothing is.
+        """
+        found = {}
+        positions = {}
+        for position, segment in enumerate(segments):
+            normalized = self.normalize(segment)
+            if not normalized:
+                continue
+            positions.setdefault(self._generate_hash(normalized, source_lang, target_lang), []).append(position)
+
+        # Segments have no in-memory tier, so those of a book that just finished must be committed first
+        self.writer.flush()
+        keys = list(positions)
+        for start in range(0, len(keys), self.LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + self.LOOKUP_BATCH_SIZE]
+            with self.database.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT hash_key, machine_translation, translated_text
+                    FROM segment_cache
+                    WHERE hash_key IN ({','.join('?' * len(batch))})
+                ''', batch).fetchall()
+            for hash_key, machine_translation, translated_text in rows:
+                for position in positions[hash_key]:
+                    found[position] = {
+                        'machine_translation': machine_translation,
+                        'translated_text': translated_text
+                    }
+        return found
+
+    def store_chunk(self, chunk: str, machine_translation: str, translated_text: str,
+                    source_lang: str, target_lang: str, skip: Set[int] = frozenset()) -> int:
+        """
+        Record the segments of a translated chunk. This only works when both
+        translations kept the paragraph structure of the source; otherwise
+        nothing is stored. Positions in `skip` are already cached.
+        """
+        segments = self.split(chunk)
+        machine_parts = machine_translation.split(SEGMENT_SEPARATOR)
+        translated_parts = translated_text.split(SEGMENT_SEPARATOR)
+        if not (len(segments) == len(machine_parts) == len(translated_parts)):
+            return 0
+
+        stored = 0
+        for position, segment in enumerate(segments):
+            normalized = self.normalize(segment)
+            if position in skip or not normalized:
+                continue
+            hash_key = self._generate_hash(normalized, source_lang, target_lang)
+            self.writer.submit('''
+                INSERT OR REPLACE INTO segment_cache
+                (hash_key, source_lang, target_lang, segment, machine_translation,
+                 translated_text, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (hash_key, source_lang, target_lang, normalized,
+                  machine_parts[position].strip(), translated_parts[position].strip()),
+                key=('segment_cache', hash_key))
+            stored += 1
+        return stored
+
+    def cleanup_old_entries(self, days: int = 30):
+        with self.database.connection() as conn:
+            conn.execute(
+                "DELETE FROM segment_cache WHERE created_at < datetime('now', ?)",
+                (f"-{days} days",)
+            )
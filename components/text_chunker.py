@@ -0,0 +1,263 @@
+import re
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+# Context windows (tokens) of common refinement models, matched on the name before the tag
+MODEL_CONTEXT_WINDOWS = {
+    'aya-expanse': 8192,
+    'aya': 8192,
+    'gemma2': 8192,
+    'gemma3': 131072,
+    'llama3.1': 131072,
+    'llama3.2': 131072,
+    'llama3.3': 131072,
+    'llama3': 8192,
+    'mistral-nemo': 131072,
+    'mistral': 32768,
+    'mixtral': 32768,
+    'phi3': 4096,
+    'qwen2.5': 32768,
+    'qwen2': 32768,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+PROMPT_OVERHEAD_TOKENS = 256
+# Larger chunks only delay the first refined output without making requests cheaper
+MAX_REFINEMENT_TOKENS = 2048
+
+# Roughly one token per CJK character, per 4 letters of a word, per 3 digits and per symbol
+_TOKEN_PATTERN = re.compile(
+    r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]'
+    r'|[^\W\d_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]{1,4}|\d{1,3}|[^\w\s]'
+)
+_ASCII_TOKEN_PATTERN = re.compile(r'[A-Za-z]{1,4}|\d{1,3}|[^\w\s]', re.ASCII)
+# Whitespace after ., !, ?, … (optionally closed by a quote or bracket), or right after a CJK full stop
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?<=[.!?…])\s+'
+    r'|(?<=[.!?…]["\'”’»)\]])\s+'
+    r'|(?<=[。！？])(?![」』”’）])\s*'
+    r'|(?<=[。！？][」』”’）])\s*'
+)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of `text` without loading a tokenizer."""
+    pattern = _ASCII_TOKEN_PATTERN if text.isascii() else _TOKEN_PATTERN
+    return len(pattern.findall(text))
+
+
+def context_window(model_name: str) -> int:
+    base = model_name.split(':', 1)[0].lower()
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if base.startswith(name)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def refinement_token_budget(model_name: str) -> int:
+    """Largest chunk whose prompt and refined output both fit in the model's context."""
+    return min(MAX_REFINEMENT_TOKENS, (context_window(model_name) - PROMPT_OVERHEAD_TOKENS) // 2)
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # byte offsets of the text in the UTF-8 encoded source
+    end: int
+
+
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _split(text: str, pattern: re.Pattern) -> Iterator[Tuple[str, str]]:
+    """Yield (piece, separator before it) around the matches of pattern."""
+    position = 0
+    separator = ''
+    for match in pattern.finditer(text):
+        if match.end() == 0 or match.start() == len(text):
+            continue
+        yield text[position:match.start()], separator
+        separator = match.group()
+        position = match.end()
+    yield text[position:], separator
+
+
+# Text chunker setup
+class TextChunker:
+    """
+    Build the chunk plans of the two translation stages.
+
+    `iter_chunks` cuts a book into refinement chunks of at most `max_tokens`
+    estimated tokens; these are the units that are refined, cached and
+    stored. `split_for_mt` cuts one of those chunks into machine translation
+    requests of at most `max_chars` characters. Both pack whole paragraphs
+    where possible, then sentences, then words, and only cut inside a word
+    that is over the limit by itself.
+
+    Every step is a single forward pass over the text, and a source stream is
+    read in blocks, so memory stays bounded by the chunk size and
+    `max_paragraph_chars` however large the manuscript is. Chunks are exact
+    slices of the source.
+    """
+
+    def __init__(self, max_tokens: int = 1000, max_chars: int = 4500,
+                 block_size: int = 1 << 16, max_paragraph_chars: int = 1 << 20):
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self.block_size = block_size
+        self.max_paragraph_chars = max_paragraph_chars
+
+    @staticmethod
+    def split_sentences(paragraph: str) -> List[str]:
+        return [sentence for sentence, _ in _split(paragraph, _SENTENCE_BOUNDARY) if sentence]
+
+    def _iter_blocks(self, source: Union[str, IO[str]]) -> Iterator[str]:
+        if isinstance(source, str):
+            for start in range(0, len(source), self.block_size):
+                yield source[start:start + self.block_size]
+            return
+        while True:
+            block = source.read(self.block_size)
+            if not block:
+                return
+            yield block
+
+    def _cut_long_paragraph(self, text: str) -> int:
+        # Cut at the last sentence end, else the last whitespace, else anywhere
+        cut = 0
+        for pattern in (_SENTENCE_BOUNDARY, _WHITESPACE):
+            for match in pattern.finditer(text):
+                if 0 < match.start() < len(text):
+                    cut = match.start()
+            if cut:
+                return cut
+        return len(text)
+
+    def _iter_paragraphs(self, blocks: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (paragraph, separator before it), splitting like
+        str.split('\n\n'). Paragraphs over max_paragraph_chars are yielded in
+        pieces, joined by the whitespace they were cut at.
+        """
+        pending = []
+        pending_length = 0
+        separator = ''
+        carry = ''
+        for block in blocks:
+            data = carry + block
+            carry = ''
+            position = 0
+            while True:
+                index = data.find(PARAGRAPH_SEPARATOR, position)
+                if index < 0:
+                    break
+                pending.append(data[position:index])
+                yield ''.join(pending), separator
+                pending, pending_length, separator = [], 0, PARAGRAPH_SEPARATOR
+                position = index + len(PARAGRAPH_SEPARATOR)
+            if data.endswith('\n') and position < len(data):
+                # A lone trailing newline might be the first half of a paragraph break
+                data, carry = data[:-1], '\n'
+            pending.append(data[position:])
+            pending_length += len(data) - position
+            if pending_length > self.max_paragraph_chars:
+                text = ''.join(pending)
+                cut = self._cut_long_paragraph(text)
+                rest = text[cut:]
+                stripped = rest.lstrip()
+                yield text[:cut], separator
+                separator = rest[:len(rest) - len(stripped)]
+                pending, pending_length = [stripped], len(stripped)
+        pending.append(carry)
+        yield ''.join(pending), separator
+
+    def _iter_units(self, paragraphs: Iterable[Tuple[str, str]], size,
+                    limit: int) -> Iterator[Tuple[str, str, int]]:
+        """Yield (unit, separator before it, size) with every unit within limit."""
+        for paragraph, separator in paragraphs:
+            paragraph_size = size(paragraph)
+            if paragraph_size <= limit:
+                yield paragraph, separator, paragraph_size
+                continue
+            for n, (sentence, sentence_separator) in enumerate(_split(paragraph, _SENTENCE_BOUNDARY)):
+                if n:
+                    separator = sentence_separator
+                sentence_size = size(sentence)
+                if sentence_size <= limit:
+                    yield sentence, separator, sentence_size
+                    continue
+                for m, (word, word_separator) in enumerate(_split(sentence, _WHITESPACE)):
+                    if m:
+                        separator = word_separator
+                    word_size = size(word)
+                    if word_size <= limit:
+                        yield word, separator, word_size
+                        continue
+                    # A size never exceeds the character count, so `limit` characters always fit
+                    for start in range(0, max(1, len(word)), limit):
+                        piece = word[start:start + limit]
+                        yield piece, separator if start == 0 else '', size(piece)
+
+    def _pack(self, units: Iterable[Tuple[str, str, int]], size, limit: int) -> Iterator[Tuple[Chunk, str]]:
+        """
+        Pack units greedily into chunks within limit. Yields (chunk, separator
+        before it). Sizes are added up rather than measured on the joined
+        text, which keeps packing linear.
+        """
+        parts = []
+        current_size = 0
+        chunk_separator = ''
+        start = offset = 0
+        for unit, separator, unit_size in units:
+            joined_size = current_size + size(separator) + unit_size
+            if parts and joined_size <= limit:
+                parts.append(separator)
+                parts.append(unit)
+                current_size = joined_size
+                offset += _byte_length(separator) + _byte_length(unit)
+                continue
+            if parts:
+                yield Chunk(''.join(parts), start, offset), chunk_separator
+            offset += _byte_length(separator)
+            start = offset
+            offset += _byte_length(unit)
+            parts, current_size, chunk_separator = [unit], unit_size, separator
+        yield Chunk(''.join(parts), start, offset), chunk_separator
+
+    def iter_chunks(self, source: Union[str, IO[str]], max_tokens: Optional[int] = None) -> Iterator[Chunk]:
+        """
+        Split a text, or a text stream read in blocks, into refinement chunks.
+        A paragraph cut across chunks ends up as separate paragraphs once the
+        chunks are joined again. Offsets refer to the text as read, so open
+        files with newline='' for them to match the file.
+        """
+        limit = max_tokens or self.max_tokens
+        paragraphs = self._iter_paragraphs(self._iter_blocks(source))
+        for chunk, _ in self._pack(self._iter_units(paragraphs, estimate_tokens, limit), estimate_tokens, limit):
+            yield chunk
+
+    def split(self, text: str, max_tokens: Optional[int] = None) -> List[str]:
+        return [chunk.text for chunk in self.iter_chunks(text, max_tokens)]
+
+    def split_for_mt(self, text: str) -> Tuple[List[str], List[str]]:
+        """
+        Split a chunk into machine translation requests. Returns the pieces and
+        the separators that join their translations back together.
+        """
+        pieces = []
+        separators = []
+        units = self._iter_units([(text, '')], len, self.max_chars)
+        for chunk, separator in self._pack(units, len, self.max_chars):
+            if pieces:
+                separators.append(separator)
+            pieces.append(chunk.text)
+        return pieces, separators
+
+    @staticmethod
+    def join(pieces: List[str], separators: List[str]) -> str:
+        joined = [pieces[0]]
+        for separator, piece in zip(separators, pieces[1:]):
+            joined.append(separator)
+            joined.append(piece)
+        return ''.join(joined)
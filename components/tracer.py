@@ -0,0 +1,173 @@
+import itertools
+import json
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+
+from components.database import Database, get_database
+from components.write_behind import WriteBehindWriter, get_writer
+
+DB_PATH = 'db/translations.db' # Define DB_PATH here
+
+
+class Trace:
+    """
+    Spans of one translation run. A span is a name, a parent span, start and
+    end times and a few attributes; spans may begin and end on different
+    threads. Span 0 is the job itself.
+    """
+
+    def __init__(self, translation_id: int):
+        self.translation_id = translation_id
+        self.started_at = time.time()
+        self._origin = time.perf_counter_ns()
+        self._ids = itertools.count(1)
+        self._threads: Dict[int, int] = {}
+        # id -> [parent, name, start_ns, end_ns, thread, attrs]; appends and item writes are atomic
+        self._spans: Dict[int, list] = {0: [None, 'job', 0, None, self._thread(), {}]}
+
+    def _thread(self) -> int:
+        ident = threading.get_ident()
+        thread = self._threads.get(ident)
+        if thread is None:
+            thread = self._threads.setdefault(ident, len(self._threads) + 1)
+        return thread
+
+    def _now(self) -> int:
+        return time.perf_counter_ns() - self._origin
+
+    def begin(self, name: str, parent: int = 0, **attrs) -> int:
+        span_id = next(self._ids)
+        self._spans[span_id] = [parent, name, self._now(), None, self._thread(), attrs]
+        return span_id
+
+    def end(self, span_id: int, **attrs):
+        span = self._spans[span_id]
+        span[3] = self._now()
+        if attrs:
+            span[5].update(attrs)
+
+    @contextmanager
+    def span(self, name: str, parent: int = 0, **attrs) -> Iterator[int]:
+        span_id = self.begin(name, parent, **attrs)
+        try:
+            yield span_id
+        finally:
+            self.end(span_id)
+
+    def record(self, name: str, seconds: float, parent: int = 0, **attrs):
+        """Add a span that just ended after `seconds`, timed by the caller."""
+        end = self._now()
+        self._spans[next(self._ids)] = [parent, name, end - int(seconds * 1e9), end, self._thread(), attrs]
+
+    def encode(self) -> bytes:
+        """Spans as zlib-compressed JSON rows of [id, parent, name, start_us, duration_us, thread, attrs]."""
+        now = self._now()
+        rows = []
+        for span_id, (parent, name, start, end, thread, attrs) in sorted(list(self._spans.items())):
+            end = now if end is None else end
+            rows.append([span_id, parent, name, start // 1000, (end - start) // 1000, thread, attrs])
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+
+
+class _NullTrace:
+    """Stands in for a Trace when tracing is off; every call is a no-op."""
+
+    _null_span = nullcontext(0)
+
+    def begin(self, name: str, parent: int = 0, **attrs) -> int:
+        return 0
+
+    def end(self, span_id: int, **attrs):
+        pass
+
+    def span(self, name: str, parent: int = 0, **attrs):
+        return self._null_span
+
+    def record(self, name: str, seconds: float, parent: int = 0, **attrs):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+# Tracer setup
+class Tracer:
+    """
+    Per-translation tracing: a span tree of job, chunks and stages.
+
+    `start` hands out a Trace for one run of a translation, or a shared no-op
+    trace when tracing is disabled. `finish` stores it in the `traces` table
+    through the write-behind writer, and `load` reads the latest run back
+    as a span tree or as a Chrome trace-event file.
+    """
+
+    def __init__(self, enabled: bool = True, db_path: str = DB_PATH,
+                 database: Optional[Database] = None, writer: Optional[WriteBehindWriter] = None):
+        self.enabled = enabled
+        self.database = database or get_database(db_path)
+        self.writer = writer or get_writer(self.database)
+
+    def start(self, translation_id: int):
+        return Trace(translation_id) if self.enabled else NULL_TRACE
+
+    def finish(self, trace, status: str):
+        if not isinstance(trace, Trace):
+            return
+        trace.end(0, status=status)
+        self.writer.submit('''
+            INSERT INTO traces (translation_id, started_at, spans)
+            VALUES (?, ?, ?)
+        ''', (trace.translation_id, trace.started_at, trace.encode()))
+
+    def load(self, translation_id: int) -> Optional[Dict]:
+        """Return the latest run of a translation as {'started_at', 'spans'}, or None."""
+        self.writer.flush()
+        with self.database.connection() as conn:
+            row = conn.execute('''
+                SELECT started_at, spans
+                FROM traces
+                WHERE translation_id = ?
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (translation_id,)).fetchone()
+        if row is None:
+            return None
+        return {'started_at': row[0], 'spans': json.loads(zlib.decompress(row[1]))}
+
+    @staticmethod
+    def to_tree(spans: List[list]) -> Dict:
+        """Nest the spans under the job span; times in milliseconds from the start."""
+        nodes = {}
+        for span_id, parent, name, start, duration, thread, attrs in spans:
+            nodes[span_id] = {
+                'name': name,
+                'start_ms': start / 1000,
+                'duration_ms': duration / 1000,
+                'thread': thread,
+                'attrs': attrs,
+                'children': []
+            }
+        for span_id, parent, *_ in spans:
+            if parent is not None and parent in nodes:
+                nodes[parent]['children'].append(nodes[span_id])
+        for node in nodes.values():
+            node['children'].sort(key=lambda child: child['start_ms'])
+        return nodes[0]
+
+    @staticmethod
+    def to_chrome(translation_id: int, spans: List[list]) -> Dict:
+        """Chrome trace-event format, for chrome://tracing or Perfetto."""
+        events = [{
+            'name': name,
+            'cat': 'translation',
+            'ph': 'X',
+            'ts': start,
+            'dur': duration,
+            'pid': translation_id,
+            'tid': thread,
+            'args': attrs
+        } for _, _, name, start, duration, thread, attrs in spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
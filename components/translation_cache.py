@@ -1,14 +1,49 @@
 import sqlite3
 import hashlib
-from typing import Optional, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List
+
+from components.database import get_database
+from components.write_behind import get_writer
+from components.segment_cache import SegmentCache
+from components.translation_memory import TranslationMemory, same_words
 
 # Translation cache setup
 class TranslationCache:
-    def __init__(self, db_path: str):
+    """
+    Two-tier translation cache.
+
+    Lookups go to a bounded in-process LRU first (limited both by entry count
+    and by the UTF-8 size of the cached texts) and fall back to SQLite. The
+    SQLite tier uses the shared connection pool of its database, so lookups
+    run concurrently, and `last_used` is refreshed in batches from a
+    background thread, so a lookup never writes.
+
+    With a TranslationMemory, cached source texts are also indexed for
+    near-duplicate lookups through `find_similar`. Paragraph-level results
+    live in `segments`, a SegmentCache on the same database.
+    """
+
+    # Keeps IN (...) lists below SQLite's host parameter limit
+    LOOKUP_BATCH_SIZE = 500
+    # Rows read per connection checkout while filling the translation memory
+    MEMORY_LOAD_BATCH_SIZE = 1000
+
+    def __init__(self, db_path: str, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 touch_interval: float = 5.0, memory: Optional[TranslationMemory] = None,
+                 segment_cache: bool = True):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+
+        self.database = get_database(self.db_path)
+        # New entries are written behind; the in-memory tier serves them meanwhile
+        self.writer = get_writer(self.database)
+        with self.database.connection() as conn:
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS translation_cache (
                     hash_key TEXT PRIMARY KEY,
                     source_lang TEXT,
@@ -20,53 +55,259 @@ class TranslationCache:
                     last_used TIMESTAMP
                 )
             ''')
-        self.conn.commit()  
+        self.segments = SegmentCache(self.database, self.writer) if segment_cache else None
+
+        self._lru = OrderedDict()
+        self._lru_bytes = 0
+        self._lru_lock = threading.Lock()
+        self._stats = {
+            'memory': {'hits': 0, 'misses': 0},
+            'sqlite': {'hits': 0, 'misses': 0},
+            'fuzzy': {'reused': 0, 'edited': 0, 'misses': 0}
+        }
+
+        self._touched = set()
+        self._touch_lock = threading.Lock()
+        self._touch_thread = None
+
+        self.memory = memory
+        if self.memory is not None:
+            threading.Thread(target=self._load_memory, name='translation-memory', daemon=True).start()
 
     def _generate_hash(self, text: str, source_lang: str, target_lang: str) -> str:
         key = f"{text}:{source_lang}:{target_lang}".encode('utf-8')
         return hashlib.sha256(key).hexdigest()
-    
+
+    def _remember(self, hash_key: str, entry: Dict[str, str]):
+        size = len(entry['translated_text'].encode('utf-8')) + len(entry['machine_translation'].encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lru_lock:
+            previous = self._lru.pop(hash_key, None)
+            if previous is not None:
+                self._lru_bytes -= previous[1]
+            self._lru[hash_key] = (entry, size)
+            self._lru_bytes += size
+            while len(self._lru) > self.max_entries or self._lru_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._lru.popitem(last=False)
+                self._lru_bytes -= evicted_size
+
+    def _touch(self, hash_key: str):
+        with self._touch_lock:
+            self._touched.add(hash_key)
+            if self._touch_thread is None:
+                self._touch_thread = threading.Thread(target=self._touch_loop, name='cache-touch', daemon=True)
+                self._touch_thread.start()
+
+    def _touch_loop(self):
+        while True:
+            time.sleep(self.touch_interval)
+            try:
+                self.flush_last_used()
+            except sqlite3.Error:
+                pass
+
+    def flush_last_used(self):
+        """Write the pending `last_used` refreshes in one transaction."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, set()
+        if not touched:
+            return
+        with self.database.connection() as conn:
+            conn.executemany('''
+                UPDATE translation_cache
+                SET last_used = CURRENT_TIMESTAMP
+                WHERE hash_key = ?
+            ''', [(hash_key,) for hash_key in touched])
+
     def get_cached_translation(self, text: str, source_lang: str, target_lang: str) -> Optional[Dict[str, str]]:
         hash_key = self._generate_hash(text, source_lang, target_lang)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute('''
+
+        with self._lru_lock:
+            cached = self._lru.get(hash_key)
+            if cached is not None:
+                self._lru.move_to_end(hash_key)
+                self._stats['memory']['hits'] += 1
+            else:
+                self._stats['memory']['misses'] += 1
+        if cached is not None:
+            self._touch(hash_key)
+            return cached[0]
+
+        with self.database.connection() as conn:
+            result = conn.execute('''
                 SELECT translated_text, machine_translation
                 FROM translation_cache
                 WHERE hash_key = ?
-            ''', (hash_key,))
-            
-            result = cur.fetchone()
-            if result:
-                conn.execute('''
-                    UPDATE translation_cache
-                    SET last_used = CURRENT_TIMESTAMP
-                    WHERE hash_key = ?
-                ''', (hash_key,))
-                return {
-                    'translated_text': result[0],
-                    'machine_translation': result[1]
+            ''', (hash_key,)).fetchone()
+
+        with self._lru_lock:
+            self._stats['sqlite']['hits' if result else 'misses'] += 1
+        if not result:
+            return None
+
+        entry = {
+            'translated_text': result[0],
+            'machine_translation': result[1]
+        }
+        self._remember(hash_key, entry)
+        self._touch(hash_key)
+        return entry
+
+    def get_cached_translations(self, texts: List[str], source_lang: str, target_lang: str) -> Dict[int, Dict[str, str]]:
+        """
+        Look up many texts at once. Returns the hits keyed by their position in
+        `texts`; the SQLite tier is queried with one IN (...) pass per batch.
+        """
+        positions = {}
+        for position, text in enumerate(texts):
+            positions.setdefault(self._generate_hash(text, source_lang, target_lang), []).append(position)
+
+        found = {}
+        with self._lru_lock:
+            for hash_key in positions:
+                cached = self._lru.get(hash_key)
+                if cached is not None:
+                    self._lru.move_to_end(hash_key)
+                    found[hash_key] = cached[0]
+            self._stats['memory']['hits'] += len(found)
+            self._stats['memory']['misses'] += len(positions) - len(found)
+
+        missing = [hash_key for hash_key in positions if hash_key not in found]
+        sqlite_hits = 0
+        for start in range(0, len(missing), self.LOOKUP_BATCH_SIZE):
+            batch = missing[start:start + self.LOOKUP_BATCH_SIZE]
+            with self.database.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT hash_key, translated_text, machine_translation
+                    FROM translation_cache
+                    WHERE hash_key IN ({','.join('?' * len(batch))})
+                ''', batch).fetchall()
+            for hash_key, translated_text, machine_translation in rows:
+                entry = {
+                    'translated_text': translated_text,
+                    'machine_translation': machine_translation
                 }
-        
-        return None
-    
-    def cache_translation(self, text: str, translated_text: str, machine_translation: str, 
+                found[hash_key] = entry
+                self._remember(hash_key, entry)
+            sqlite_hits += len(rows)
+
+        with self._lru_lock:
+            self._stats['sqlite']['hits'] += sqlite_hits
+            self._stats['sqlite']['misses'] += len(missing) - sqlite_hits
+        for hash_key in found:
+            self._touch(hash_key)
+
+        return {
+            position: entry
+            for hash_key, entry in found.items()
+            for position in positions[hash_key]
+        }
+
+    def _load_memory(self):
+        # Newest rows first, a batch per connection checkout, until the memory is full
+        last_rowid = (1 << 63) - 1
+        while not self.memory.full:
+            with self.database.connection() as conn:
+                rows = conn.execute('''
+                    SELECT rowid, hash_key, source_lang, target_lang, original_text
+                    FROM translation_cache
+                    WHERE rowid < ?
+                    ORDER BY rowid DESC
+                    LIMIT ?
+                ''', (last_rowid, self.MEMORY_LOAD_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            for _, hash_key, source_lang, target_lang, original_text in rows:
+                # Entries cached since the start are newer than anything read here
+                self.memory.add(hash_key, original_text, source_lang, target_lang, oldest=True)
+            last_rowid = rows[-1][0]
+
+    def find_similar(self, text: str, source_lang: str, target_lang: str) -> Optional[Dict]:
+        """
+        Return the cached entry closest to `text` in the translation memory, with
+        its `similarity` and whether it can be reused unchanged (`reuse`).
+
+        The MinHash similarity is only an estimate and passes 0.98 even when
+        a word changed, so a match is only reused when its source has the same
+        words as `text`; any other match goes through the edit prompt.
+        """
+        if self.memory is None:
+            return None
+        match = self.memory.query(text, source_lang, target_lang)
+        row = None
+        if match is not None:
+            # The matched entry may still be waiting in the write-behind queue
+            self.writer.flush()
+            with self.database.connection() as conn:
+                row = conn.execute('''
+                    SELECT original_text, translated_text, machine_translation
+                    FROM translation_cache
+                    WHERE hash_key = ?
+                ''', (match[0],)).fetchone()
+        if row is None:
+            if match is not None:
+                # Its cache row is gone
+                self.memory.remove(match[0])
+            with self._lru_lock:
+                self._stats['fuzzy']['misses'] += 1
+            return None
+
+        similarity = match[1]
+        reuse = similarity >= self.memory.reuse_threshold and same_words(text, row[0])
+        with self._lru_lock:
+            self._stats['fuzzy']['reused' if reuse else 'edited'] += 1
+        self._touch(match[0])
+        return {
+            'original_text': row[0],
+            'translated_text': row[1],
+            'machine_translation': row[2],
+            'similarity': similarity,
+            'reuse': reuse
+        }
+
+    def cache_translation(self, text: str, translated_text: str, machine_translation: str,
                          source_lang: str, target_lang: str):
         hash_key = self._generate_hash(text, source_lang, target_lang)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO translation_cache
-                (hash_key, source_lang, target_lang, original_text, translated_text, 
-                 machine_translation, created_at, last_used)
-                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            ''', (hash_key, source_lang, target_lang, text, translated_text, machine_translation))
-    
+
+        self.writer.submit('''
+            INSERT OR REPLACE INTO translation_cache
+            (hash_key, source_lang, target_lang, original_text, translated_text,
+             machine_translation, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', (hash_key, source_lang, target_lang, text, translated_text, machine_translation),
+            key=('translation_cache', hash_key))
+        self._remember(hash_key, {
+            'translated_text': translated_text,
+            'machine_translation': machine_translation
+        })
+        if self.memory is not None:
+            self.memory.add(hash_key, text, source_lang, target_lang)
+
+    def get_stats(self) -> Dict:
+        with self._lru_lock:
+            return {
+                'memory': dict(self._stats['memory'], entries=len(self._lru), bytes=self._lru_bytes),
+                'sqlite': dict(self._stats['sqlite']),
+                'fuzzy': dict(self._stats['fuzzy'], entries=len(self.memory) if self.memory is not None else 0)
+            }
+
     def cleanup_old_entries(self, days: int = 30):
-        with sqlite3.connect(self.db_path) as conn:
-            # Use direct string formatting for date arithmetic since SQLite's 
+        # Recently used entries must not look stale because their refresh is still pending
+        self.flush_last_used()
+        with self.database.connection() as conn:
+            # Use direct string formatting for date arithmetic since SQLite's
             # datetime() function doesn't accept parameters for interval
+            stale = conn.execute(
+                "SELECT hash_key FROM translation_cache WHERE last_used < datetime('now', ?)",
+                (f"-{days} days",)
+            ).fetchall()
             conn.execute(
                 "DELETE FROM translation_cache WHERE last_used < datetime('now', ?)",
                 (f"-{days} days",)
             )
+        if self.memory is not None:
+            for hash_key, in stale:
+                self.memory.remove(hash_key)
+        if self.segments is not None:
+            self.segments.cleanup_old_entries(days)
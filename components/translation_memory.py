@@ -0,0 +1,168 @@
+import re
+import threading
+from array import array
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+_EMPTY = (1 << 64) - 1
+_MASK = (1 << 64) - 1
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def same_words(a: str, b: str) -> bool:
+    """True when two texts differ at most in whitespace and punctuation."""
+    return _NON_WORD.sub(' ', a).split() == _NON_WORD.sub(' ', b).split()
+
+# Fuzzy translation memory
+class TranslationMemory:
+    """
+    Near-duplicate index over cached source texts.
+
+    Texts are reduced to word shingles and summarised by a one-permutation
+    MinHash signature: every shingle is hashed once and the minimum is kept
+    per bin, so building a signature is linear in the text length. Signatures
+    are split into bands for LSH, and a lookup only compares the entries that
+    share at least one band, which keeps it independent of the index size.
+
+    Both the index and its buckets are bounded. At most `max_entries` texts
+    are kept, and the least recently added or matched one is evicted first.
+    A bucket keeps the `max_bucket_size` latest entries, so boilerplate that
+    lands thousands of passages in one bucket costs a lookup at most
+    bands * max_bucket_size comparisons.
+
+    The index lives in memory only and uses Python's string hash, so it is
+    filled again from the cache database when the process starts.
+    """
+
+    def __init__(self, num_bins: int = 32, bands: int = 8, shingle_size: int = 3,
+                 reuse_threshold: float = 0.98, edit_threshold: float = 0.8,
+                 max_entries: int = 50000, max_bucket_size: int = 32):
+        if num_bins % bands:
+            raise ValueError("num_bins must be a multiple of bands")
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.shingle_size = shingle_size
+        self.reuse_threshold = reuse_threshold
+        self.edit_threshold = edit_threshold
+        self.max_entries = max(1, max_entries)
+        self.max_bucket_size = max(1, max_bucket_size)
+        # hash_key -> (signature, band keys), least recently used first
+        self._entries: 'OrderedDict[str, Tuple[array, array]]' = OrderedDict()
+        self._buckets: Dict[int, deque] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def full(self) -> bool:
+        return len(self._entries) >= self.max_entries
+
+    def signature(self, text: str) -> array:
+        words = text.split()
+        size = self.shingle_size
+        if len(words) < size:
+            shingles = [' '.join(words)] if words else []
+        else:
+            shingles = [' '.join(words[n:n + size]) for n in range(len(words) - size + 1)]
+
+        num_bins = self.num_bins
+        signature = array('Q', [_EMPTY]) * num_bins
+        for shingle in shingles:
+            value = hash(shingle) & _MASK
+            slot = value % num_bins
+            value //= num_bins
+            if value < signature[slot]:
+                signature[slot] = value
+        return signature
+
+    def _band_keys(self, signature: array, source_lang: str, target_lang: str) -> array:
+        keys = array('q')
+        for band in range(self.bands):
+            values = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            if all(value == _EMPTY for value in values):
+                continue
+            keys.append(hash((source_lang, target_lang, band, values)))
+        return keys
+
+    def similarity(self, a: array, b: array) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        filled = equal = 0
+        for x, y in zip(a, b):
+            if x == _EMPTY and y == _EMPTY:
+                continue
+            filled += 1
+            if x == y:
+                equal += 1
+        return equal / filled if filled else 0.0
+
+    def add(self, hash_key: str, text: str, source_lang: str, target_lang: str, oldest: bool = False):
+        """
+        Index a text. With `oldest`, it is added as the least recently used
+        entry and skipped when the index is full, which is how older cache
+        rows are loaded without evicting newer ones.
+        """
+        with self._lock:
+            if hash_key in self._entries:
+                if not oldest:
+                    self._entries.move_to_end(hash_key)
+                return
+            if oldest and self.full:
+                return
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature, source_lang, target_lang)
+        with self._lock:
+            if hash_key in self._entries:
+                return
+            while self.full:
+                self._discard(next(iter(self._entries)))
+            self._entries[hash_key] = (signature, band_keys)
+            if oldest:
+                self._entries.move_to_end(hash_key, last=False)
+            for key in band_keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = deque(maxlen=self.max_bucket_size)
+                bucket.append(hash_key)
+
+    def remove(self, hash_key: str):
+        """Drop a text, for example after its cache row was deleted."""
+        with self._lock:
+            if hash_key in self._entries:
+                self._discard(hash_key)
+
+    def _discard(self, hash_key: str):
+        _, band_keys = self._entries.pop(hash_key)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(hash_key)
+            except ValueError:
+                # Already pushed out of a full bucket
+                pass
+            if not bucket:
+                del self._buckets[key]
+
+    def query(self, text: str, source_lang: str, target_lang: str) -> Optional[Tuple[str, float]]:
+        """Return (hash_key, similarity) of the closest entry above edit_threshold."""
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature, source_lang, target_lang)
+        with self._lock:
+            candidates = set()
+            for key in band_keys:
+                candidates.update(self._buckets.get(key, ()))
+            best_key, best = None, 0.0
+            for hash_key in candidates:
+                entry = self._entries.get(hash_key)
+                if entry is None:
+                    continue
+                score = self.similarity(signature, entry[0])
+                if score > best:
+                    best_key, best = hash_key, score
+            if best_key is None or best < self.edit_threshold:
+                return None
+            self._entries.move_to_end(best_key)
+            return best_key, best
@@ -3,44 +3,64 @@ import sqlite3
 from typing import List, Dict, Optional, Tuple, Callable
 from datetime import datetime, timedelta
 
+from components.database import get_database
+
 
 DB_PATH = 'db/translations.db' # Define DB_PATH here
+FAILED_FIELDS = ['id', 'filename', 'source_lang', 'target_lang', 'model', 'status', 'progress',
+                 'current_chunk', 'total_chunks', 'created_at', 'updated_at', 'error_message']
 
 # Translation Recovery
 class TranslationRecovery:
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
+        self.database = get_database(db_path)
         
-    def get_failed_translations(self) -> List[Dict]:
-        with sqlite3.connect(self.db_path) as conn:
+    def get_failed_translations(self, fields: List[str] = FAILED_FIELDS) -> List[Dict]:
+        # Callers pass validated column names only; the book texts are never selected here
+        with self.database.connection() as conn:
             conn.row_factory = sqlite3.Row
-            cur = conn.execute('''
-                SELECT * FROM translations 
+            cur = conn.execute(f'''
+                SELECT {', '.join(fields)} FROM translations
                 WHERE status = 'error'
                 ORDER BY created_at DESC
             ''')
             return [dict(row) for row in cur.fetchall()]
         
-    def retry_translation(self, translation_id: int):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+    def retry_translation(self, translation_id: int) -> bool:
+        """Queue a failed translation again; False when it does not exist or has not failed."""
+        # Completed chunks are kept, so the job queue resumes after the last finished one
+        with self.database.connection() as conn:
+            # Only failed rows: a pending row would be claimed by a second worker while the first still runs it
+            cur = conn.execute('''
                 UPDATE translations
                 SET status = 'pending', progress = 0, error_message = NULL,
                     current_chunk = 0, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
+                WHERE id = ? AND status = 'error'
             ''', (translation_id,))
+            if cur.rowcount == 0:
+                return False
             
             conn.execute('''
                 UPDATE chunks
                 SET status = 'pending', error_message = NULL
                 WHERE translation_id = ? AND status = 'error'
             ''', (translation_id,))
+            return True
             
     def cleanup_failed_translations(self, days: int = 7):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.database.connection() as conn:
             # Use direct string formatting for date arithmetic since SQLite's
             # datetime() function doesn't accept parameters for interval
             conn.execute(
                 "DELETE FROM translations WHERE status = 'error' AND created_at < datetime('now', ?)",
                 (f"-{days} days",)
-            )
\ No newline at end of file
+            )
+            # Chunks of the rows removed above, and of completed rows whose texts are in the blob store
+            conn.execute('''
+                DELETE FROM chunks
+                WHERE translation_id NOT IN (
+                    SELECT id FROM translations
+                    WHERE status != 'completed' OR translated_blob IS NULL
+                )
+            ''')
\ No newline at end of file
@@ -0,0 +1,176 @@
+import atexit
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
+
+from components.database import Database
+
+# Write-behind writer setup
+class WriteBehindWriter:
+    """
+    Run writes on a background thread, batched into one transaction.
+
+    `submit` queues a statement and returns at once; the writer commits
+    everything pending when `max_batch` statements are waiting or
+    `max_delay` seconds after the first one, whichever comes first.
+    Statements submitted with the same key replace each other while
+    pending, so only the latest progress of a translation is written.
+    Statements run in the order their keys were first queued.
+
+    At most `max_pending` statements wait at a time; beyond that `submit`
+    blocks until the writer catches up. `flush` returns once everything
+    submitted before it is committed, so callers flush before they read back
+    or finish a translation.
+
+    When a batch fails it is rolled back and its statements are run again
+    one at a time, so only the statements that fail on their own are lost.
+    Their error is kept for the `owner` they were submitted with (a
+    translation id, say) and raised by the next `flush(owner=...)` of that
+    owner; failures without an owner are only logged.
+    """
+
+    def __init__(self, database: Database, max_batch: int = 200, max_delay: float = 0.05,
+                 max_pending: int = 5000, logger=None, monitor=None):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.logger = logger
+        self.monitor = monitor # records the commit time of every batch as the db_write stage
+        self._pending: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._unkeyed = itertools.count()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+        self._flushing = 0
+        self._errors: Dict[Hashable, Exception] = {}
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'statements': 0, 'coalesced': 0, 'batches': 0, 'blocked': 0, 'errors': 0}
+
+    def submit(self, sql: str, params: Sequence = (), key: Optional[Hashable] = None,
+               owner: Optional[Hashable] = None):
+        if key is None:
+            key = ('unkeyed', next(self._unkeyed))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-behind writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                self._stats['blocked'] += 1
+                while key not in self._pending and len(self._pending) >= self.max_pending:
+                    self._cond.wait()
+            if key in self._pending:
+                self._stats['coalesced'] += 1
+            self._pending[key] = (sql, params, owner)
+            self._submitted += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None, owner: Optional[Hashable] = None):
+        """
+        Wait until everything submitted so far is committed. With an owner,
+        raise the error of a statement of that owner that could not be written.
+        """
+        with self._cond:
+            target = self._submitted
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                if not self._cond.wait_for(lambda: self._committed >= target, timeout):
+                    raise TimeoutError(f"Pending writes not committed within {timeout}s")
+            finally:
+                self._flushing -= 1
+            error = self._errors.pop(owner, None) if owner is not None else None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while len(self._pending) < self.max_batch and not self._flushing and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = list(self._pending.values())
+                self._pending.clear()
+                target = self._submitted
+                # Room in the queue again for blocked submitters
+                self._cond.notify_all()
+
+            start = time.perf_counter()
+            success = False
+            try:
+                with self.database.connection() as conn:
+                    for sql, params, _ in batch:
+                        conn.execute(sql, params)
+                success = True
+            except Exception as e:
+                if self.logger:
+                    self.logger.app_logger.error(
+                        f"Write-behind batch of {len(batch)} failed, writing its statements one by one: {str(e)}"
+                    )
+                self._write_each(batch)
+            if self.monitor is not None:
+                database = os.path.basename(self.database.path)
+                self.monitor.observe_stage('db_write', time.perf_counter() - start, database=database)
+                if not success:
+                    self.monitor.stage_errors.inc(stage='db_write', database=database)
+
+            with self._cond:
+                self._committed = target
+                self._stats['statements'] += len(batch)
+                self._stats['batches'] += 1
+                self._cond.notify_all()
+
+    def _write_each(self, batch):
+        for sql, params, owner in batch:
+            try:
+                with self.database.connection() as conn:
+                    conn.execute(sql, params)
+            except Exception as e:
+                if self.logger:
+                    self.logger.app_logger.error(f"Write-behind statement of {owner!r} failed: {str(e)}")
+                with self._cond:
+                    self._stats['errors'] += 1
+                    if owner is not None:
+                        self._errors.setdefault(owner, e)
+
+    def close(self):
+        """Commit what is pending and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
+
+
+_writers: Dict[int, WriteBehindWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(database: Database, **options) -> WriteBehindWriter:
+    """
+    Return the shared writer of `database`, creating it on first use. As with
+    get_database, options only apply to that first call.
+    """
+    with _writers_lock:
+        writer = _writers.get(id(database))
+        if writer is None:
+            writer = _writers[id(database)] = WriteBehindWriter(database, **options)
+        return writer
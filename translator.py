@@ -19,34 +19,133 @@ from werkzeug.utils import secure_filename
 from components.app_logger import AppLogger
 from components.app_monitor import AppMonitor, TranslationMetrics
 from components.translation_cache import TranslationCache
+from components.translation_memory import TranslationMemory
 from components.book_translator import BookTranslator
-from components.translation_recovery import TranslationRecovery
+from components.machine_translation import GoogleMachineTranslator
+from components.translation_recovery import FAILED_FIELDS, TranslationRecovery
+from components.chunk_store import TEXT_FIELDS, ChunkStore
+from components.blob_store import BlobStore, detect_encoding
+from components.progress_stream import PROTOCOL_V2, encode_sse, stream_events
+from components.ollama_pool import RefinementDispatcher, parse_endpoints
+from components.rate_limiter import RateLimiter
+from components.ollama_health import OllamaHealthMonitor
+from components.job_queue import TranslationJobQueue
+from components.database import get_database
+from components.write_behind import get_writer
+from components.tracer import Tracer
 
 # init FLASK
 app = Flask(__name__)
 CORS(app)
 
 # Folders setup
-UPLOAD_FOLDER = 'uploads'
-TRANSLATIONS_FOLDER = 'translations'
 STATIC_FOLDER = 'static'
 LOG_FOLDER = 'logs'
 DB_FOLDER = 'db'
 DB_PATH = DB_FOLDER + '/translations.db'
 CACHE_DB_PATH = DB_FOLDER + '/cache.db'
+BLOB_FOLDER = DB_FOLDER + '/blobs'
+
+# Ollama endpoints, e.g. "http://gpu1:11434|2,http://gpu2:11434" ("|n" = concurrent requests)
+OLLAMA_ENDPOINTS = os.environ.get('OLLAMA_ENDPOINTS', 'http://localhost:11434')
+OLLAMA_CONCURRENCY = int(os.environ.get('OLLAMA_CONCURRENCY', '1'))
+OLLAMA_PROBE_INTERVAL = float(os.environ.get('OLLAMA_PROBE_INTERVAL', '10'))
+# Stream refinements token by token; a generation with no new token for OLLAMA_STALL_TIMEOUT seconds fails
+OLLAMA_STREAM = os.environ.get('OLLAMA_STREAM', 'true') == 'true'
+OLLAMA_STALL_TIMEOUT = float(os.environ.get('OLLAMA_STALL_TIMEOUT', '30'))
+# Seconds to wait for the first token, which includes loading the model and evaluating the prompt
+OLLAMA_FIRST_TOKEN_TIMEOUT = float(os.environ.get('OLLAMA_FIRST_TOKEN_TIMEOUT', '1800'))
+# Requests per second allowed per Ollama endpoint (0 = only bounded by concurrency) and burst size
+OLLAMA_RATE = float(os.environ.get('OLLAMA_RATE', '0'))
+OLLAMA_BURST = int(os.environ.get('OLLAMA_BURST', '1'))
+
+# Estimated tokens per refinement chunk (0 = derived from the model's context window)
+REFINE_CHUNK_TOKENS = int(os.environ.get('REFINE_CHUNK_TOKENS', '0'))
+
+# Google Translate requests per second and burst size, shared by all running translations
+MT_RATE = float(os.environ.get('MT_RATE', '5'))
+MT_BURST = int(os.environ.get('MT_BURST', '5'))
+# Google Translate requests in flight per translation
+MT_WORKERS = int(os.environ.get('MT_WORKERS', '8'))
+# Google Translate URL; point it at a compatible server such as the benchmark stub (benchmarks/stubs.py)
+MT_URL = os.environ.get('MT_URL', '')
+
+# In-memory cache tier limits
+CACHE_MEMORY_ENTRIES = int(os.environ.get('CACHE_MEMORY_ENTRIES', '10000'))
+CACHE_MEMORY_MB = int(os.environ.get('CACHE_MEMORY_MB', '64'))
+
+# Fuzzy translation memory: reuse near-identical chunks, edit similar ones
+TRANSLATION_MEMORY = os.environ.get('TRANSLATION_MEMORY', 'true') == 'true'
+TM_REUSE_THRESHOLD = float(os.environ.get('TM_REUSE_THRESHOLD', '0.98'))
+TM_EDIT_THRESHOLD = float(os.environ.get('TM_EDIT_THRESHOLD', '0.8'))
+TM_MAX_ENTRIES = int(os.environ.get('TM_MAX_ENTRIES', '50000'))
+
+# Number of books translated at the same time
+TRANSLATION_WORKERS = int(os.environ.get('TRANSLATION_WORKERS', '2'))
+
+# SQLite connection pool and pragmas, applied to both databases
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '8'))
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', '5'))
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB', '256'))
+# Chunk, progress and cache writes are committed in batches of WRITE_BATCH_SIZE or every WRITE_BATCH_MS
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', '200'))
+WRITE_BATCH_MS = float(os.environ.get('WRITE_BATCH_MS', '50'))
+WRITE_QUEUE_SIZE = int(os.environ.get('WRITE_QUEUE_SIZE', '5000'))
+# Record a span timeline of every translation run, served at /translations/<id>/trace
+TRACING = os.environ.get('TRACING', 'true') == 'true'
 
 # Create necessary directories
-for folder in [UPLOAD_FOLDER, TRANSLATIONS_FOLDER, STATIC_FOLDER, LOG_FOLDER, DB_FOLDER]:
+for folder in [STATIC_FOLDER, LOG_FOLDER, DB_FOLDER, BLOB_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
+# Initialize databases; every component on the same file shares its pool
+sqlite_options = dict(
+    pool_size=SQLITE_POOL_SIZE,
+    busy_timeout=SQLITE_BUSY_TIMEOUT,
+    synchronous=SQLITE_SYNCHRONOUS,
+    mmap_size=SQLITE_MMAP_MB * 1024 * 1024
+)
+database = get_database(DB_PATH, **sqlite_options)
+cache_database = get_database(CACHE_DB_PATH, **sqlite_options)
+
 # Initialize logger
 logger = AppLogger()
 
 # Initialize monitor
 monitor = AppMonitor()
 
+# Initialize write-behind writers before the components that share them
+writer_options = dict(
+    max_batch=WRITE_BATCH_SIZE,
+    max_delay=WRITE_BATCH_MS / 1000,
+    max_pending=WRITE_QUEUE_SIZE,
+    logger=logger,
+    monitor=monitor
+)
+writer = get_writer(database, **writer_options)
+cache_writer = get_writer(cache_database, **writer_options)
+
 # Initialize cache
-cache = TranslationCache(db_path=CACHE_DB_PATH)
+translation_memory = TranslationMemory(
+    reuse_threshold=TM_REUSE_THRESHOLD,
+    edit_threshold=TM_EDIT_THRESHOLD,
+    max_entries=TM_MAX_ENTRIES
+) if TRANSLATION_MEMORY else None
+cache = TranslationCache(
+    db_path=CACHE_DB_PATH,
+    max_entries=CACHE_MEMORY_ENTRIES,
+    max_bytes=CACHE_MEMORY_MB * 1024 * 1024,
+    memory=translation_memory
+)
+
+# Initialize refinement dispatcher shared by all translations
+refinement_dispatcher = RefinementDispatcher(
+    parse_endpoints(OLLAMA_ENDPOINTS, OLLAMA_CONCURRENCY),
+    rate=OLLAMA_RATE,
+    burst=OLLAMA_BURST
+)
+mt_limiter = RateLimiter(MT_RATE, MT_BURST, name='google')
 
 # Error handling setup
 class TranslationError(Exception):
@@ -73,13 +172,10 @@ def with_error_handling(f: Callable):
 
 # Initialize database
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        # Drop existing tables if they exist and recreate them
+    with database.connection() as conn:
+        # Create tables if needed; existing rows are kept so queued jobs survive restarts
         conn.executescript('''
-            DROP TABLE IF EXISTS chunks;
-            DROP TABLE IF EXISTS translations;
-        
-            CREATE TABLE translations (
+            CREATE TABLE IF NOT EXISTS translations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 source_lang TEXT NOT NULL,
@@ -92,6 +188,10 @@ def init_db():
                 original_text TEXT,
                 machine_translation TEXT,
                 translated_text TEXT,
+                original_blob TEXT,  -- SHA-256 of the upload in the blob store
+                original_encoding TEXT,
+                machine_translation_blob TEXT,
+                translated_blob TEXT,
                 detected_language TEXT,
                 genre TEXT DEFAULT 'unknown',  -- Added genre with default value
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -100,11 +200,12 @@ def init_db():
                 llm_refine BOOLEAN DEFAULT TRUE  -- ADDED llm_refine
             );
         
-            CREATE TABLE chunks (
+            CREATE TABLE IF NOT EXISTS chunks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 translation_id INTEGER,
                 chunk_number INTEGER,
                 original_text TEXT,
+                source_hash TEXT,
                 machine_translation TEXT,
                 translated_text TEXT,
                 status TEXT,
@@ -112,24 +213,170 @@ def init_db():
                 attempts INTEGER DEFAULT 0,
                 FOREIGN KEY (translation_id) REFERENCES translations (id)
             );
+
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_translation_chunk
+                ON chunks (translation_id, chunk_number);
+
+            -- Keyset pagination of the history, with and without a status filter
+            CREATE INDEX IF NOT EXISTS idx_translations_created
+                ON translations (created_at);
+            CREATE INDEX IF NOT EXISTS idx_translations_status_created
+                ON translations (status, created_at);
+
+            -- One row per run of a translation; spans is zlib-compressed JSON
+            CREATE TABLE IF NOT EXISTS traces (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                translation_id INTEGER,
+                started_at REAL,
+                spans BLOB,
+                FOREIGN KEY (translation_id) REFERENCES translations (id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_traces_translation
+                ON traces (translation_id);
         ''')
 
+        # Columns added after the first release; CREATE TABLE IF NOT EXISTS leaves older tables alone
+        added_columns = [
+            ('translations', 'original_blob', 'TEXT'),
+            ('translations', 'original_encoding', 'TEXT'),
+            ('translations', 'machine_translation_blob', 'TEXT'),
+            ('translations', 'translated_blob', 'TEXT'),
+            ('chunks', 'source_hash', 'TEXT'),
+        ]
+        for table, column, column_type in added_columns:
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
 init_db()
 
+blob_store = BlobStore(root=BLOB_FOLDER)
 recovery = TranslationRecovery(db_path=DB_PATH)
+chunk_store = ChunkStore(db_path=DB_PATH, blobs=blob_store)
+tracer = Tracer(enabled=TRACING, database=database, writer=writer)
 
-# Health checking middleware
-@app.before_request
-def check_ollama():
-    if request.endpoint != 'health_check':
+# Background translation jobs
+def run_translation_job(translation_id: int):
+    with database.connection() as conn:
+        conn.row_factory = sqlite3.Row
+        job = conn.execute('''
+            SELECT original_text, original_blob, original_encoding,
+                   source_lang, target_lang, model, llm_refine
+            FROM translations
+            WHERE id = ?
+        ''', (translation_id,)).fetchone()
+    # The chunker reads the stored upload through mmap instead of a copy in memory
+    if job['original_blob']:
+        source = blob_store.open_text(job['original_blob'], job['original_encoding'] or 'utf-8')
+    else:
+        source = job['original_text']
+    translator = BookTranslator(
+        model_name=job['model'],
+        chunk_size=REFINE_CHUNK_TOKENS or None,
+        llm_refine=bool(job['llm_refine']),
+        dispatcher=refinement_dispatcher,
+        stream_refinement=OLLAMA_STREAM,
+        stall_timeout=OLLAMA_STALL_TIMEOUT,
+        first_token_timeout=OLLAMA_FIRST_TOKEN_TIMEOUT,
+        mt_limiter=mt_limiter,
+        mt_workers=MT_WORKERS,
+        mt_backend=lambda source_lang, target_lang: GoogleMachineTranslator(
+            source_lang, target_lang, limiter=mt_limiter, url=MT_URL or None
+        ),
+        tracer=tracer
+    )
+    return translator.translate_text(
+        source, job['source_lang'], job['target_lang'],
+        translation_id, logger, monitor, cache
+    )
+
+job_queue = TranslationJobQueue(
+    run_translation_job,
+    db_path=DB_PATH,
+    workers=TRANSLATION_WORKERS,
+    logger=logger
+)
+
+def job_events(translation_id: int, subscription):
+    """Replay the stored chunks of a job, then follow its live events."""
+    with database.connection() as conn:
+        conn.row_factory = sqlite3.Row
+        job = conn.execute('''
+            SELECT status, progress, current_chunk, total_chunks, error_message
+            FROM translations
+            WHERE id = ?
+        ''', (translation_id,)).fetchone()
+    # A completed job has no chunk rows left; its texts are replayed from the blob store
+    if job['status'] == 'completed':
+        stored_chunks = chunk_store.final_chunks(translation_id)
+    else:
+        stored_chunks = chunk_store.get_chunks(translation_id)
+    if stored_chunks:
+        yield {
+            'progress': job['progress'],
+            'stage': 'snapshot',
+            'current_chunk': job['current_chunk'],
+            'total_chunks': job['total_chunks'],
+            'chunks': stored_chunks
+        }
+    if job['status'] == 'completed':
+        yield {'progress': 100, 'status': 'completed'}
+        return
+    if job['status'] == 'error':
+        yield {'error': job['error_message']}
+        return
+
+    # Events of chunks already in the snapshot were queued before it was read; v1 would append their texts twice
+    replayed = {chunk['index'] for chunk in stored_chunks}
+    for event in subscription:
+        chunk_index = event.get('chunk_index', event.get('refining_chunk', event.get('refined_chunk')))
+        if 'stage' in event and chunk_index in replayed:
+            continue
+        yield event
+
+def stream_job(translation_id: int) -> Response:
+    # ?protocol=v1 keeps the original full-text events; v2 sends per-chunk deltas
+    protocol = request.args.get('protocol', PROTOCOL_V2)
+    max_events_per_second = request.args.get('max_events_per_second', type=float)
+    # Subscribe before reading the stored state so no event falls in between
+    subscription = job_queue.subscribe(translation_id)
+
+    def generate():
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logger.app_logger.error(f"Ollama health check failed: {str(e)}")
-            return jsonify({
-                'error': 'Translation service is not available'
-            }), 503
+            for payload in stream_events(job_events(translation_id, subscription), protocol, max_events_per_second):
+                # Resuming after the yield means the server has written the event out
+                start = time.perf_counter()
+                yield payload
+                monitor.observe_stage('sse_emit', time.perf_counter() - start, protocol=protocol)
+        except Exception as e:
+            error_message = str(e)
+            logger.translation_logger.error(f"Translation error: {error_message}")
+            logger.translation_logger.error(traceback.format_exc())
+            yield encode_sse({'error': error_message})
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream')
+
+# Health checking: a background prober keeps the Ollama status cached
+ollama_health = OllamaHealthMonitor(
+    refinement_dispatcher.endpoints,
+    interval=OLLAMA_PROBE_INTERVAL,
+    logger=logger
+)
+
+def ollama_unavailable():
+    return jsonify({
+        'error': 'Translation service is not available'
+    }), 503
+
+def requires_ollama(f: Callable):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not ollama_health.is_available():
+            return ollama_unavailable()
+        return f(*args, **kwargs)
+    return wrapper
 
 # Flask routes
 @app.route('/')
@@ -141,9 +388,10 @@ def serve_static(path):
     return send_from_directory('static', path)
 
 @app.route('/models', methods=['GET'])
+@requires_ollama
 @with_error_handling
 def get_models():
-    translator = BookTranslator()
+    translator = BookTranslator(dispatcher=refinement_dispatcher)
     available_models = translator.get_available_models()
     models = []
     for model_name in available_models:
@@ -154,32 +402,146 @@ def get_models():
         })
     return jsonify({'models': models})
 
+# Row fields a client can ask for with ?fields=a,b,c
+TRANSLATION_FIELDS = [
+    'id', 'filename', 'source_lang', 'target_lang', 'model', 'status', 'progress',
+    'current_chunk', 'total_chunks', 'detected_language', 'genre', 'llm_refine',
+    'created_at', 'updated_at', 'error_message',
+    'original_blob', 'original_encoding', 'machine_translation_blob', 'translated_blob'
+]
+LIST_FIELDS = [
+    'id', 'filename', 'source_lang', 'target_lang', 'model', 'status', 'progress',
+    'detected_language', 'created_at', 'updated_at', 'error_message'
+]
+# Columns fill_texts needs to load the texts, whether or not they were requested
+TEXT_SOURCE_FIELDS = [
+    'id', 'status', 'original_blob', 'original_encoding', 'machine_translation_blob', 'translated_blob'
+]
+TRANSLATION_STATUSES = ['pending', 'in_progress', 'completed', 'error']
+TRANSLATIONS_PAGE_SIZE = 50
+TRANSLATIONS_MAX_PAGE_SIZE = 500
+
+def requested_fields(default: List[str], allowed: List[str]) -> List[str]:
+    """Parse ?fields=, keeping the order given. Raises ValueError on unknown names."""
+    fields = request.args.get('fields')
+    if not fields:
+        return default
+    fields = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
 @app.route('/translations', methods=['GET'])
 @with_error_handling
 def get_translations():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute('''
-            SELECT id, filename, source_lang, target_lang, model,
-                   status, progress, detected_language, created_at, 
-                   updated_at, error_message
+    """
+    Newest first, a page at a time. Pass the returned next_cursor as ?cursor=
+    for the next page; ?status=a,b filters, ?limit= sets the page size.
+    """
+    try:
+        fields = requested_fields(LIST_FIELDS, TRANSLATION_FIELDS)
+        limit = max(1, min(int(request.args.get('limit', TRANSLATIONS_PAGE_SIZE)), TRANSLATIONS_MAX_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    statuses = list(dict.fromkeys(status for status in request.args.get('status', '').split(',') if status))
+    unknown = [status for status in statuses if status not in TRANSLATION_STATUSES]
+    if unknown:
+        return jsonify({'error': f"Unknown statuses: {', '.join(unknown)}"}), 400
+    conditions = []
+    params = []
+    cursor = request.args.get('cursor')
+    if cursor:
+        # The cursor is the (created_at, id) of the last row of the previous page
+        created_at, _, last_id = cursor.rpartition('|')
+        if not created_at or not last_id.isdigit():
+            return jsonify({'error': 'Invalid cursor'}), 400
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend([created_at, int(last_id)])
+
+    def page_query(status_conditions: List[str]) -> str:
+        where = ' AND '.join(status_conditions + conditions)
+        return f'''
+            SELECT {', '.join(dict.fromkeys(fields + ['id', 'created_at']))}
             FROM translations
-            ORDER BY created_at DESC
-        ''')
-        translations = [dict(row) for row in cur.fetchall()]
-    return jsonify({'translations': translations})
+            {f"WHERE {where}" if where else ''}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        '''
+
+    # One row past the page tells whether another page follows
+    if len(statuses) > 1:
+        # status IN (...) cannot walk the (status, created_at) index in order and
+        # sorts every match; each status reads only its own page from the index instead
+        query = f'''
+            {' UNION ALL '.join(f'SELECT * FROM ({page_query(["status = ?"])})' for _ in statuses)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        '''
+        query_params = [value for status in statuses for value in [status, *params, limit + 1]] + [limit + 1]
+    else:
+        query = page_query(['status = ?'] if statuses else [])
+        query_params = statuses + params + [limit + 1]
+    with database.connection() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(query, query_params).fetchall()
+
+    page = rows[:limit]
+    next_cursor = f"{page[-1]['created_at']}|{page[-1]['id']}" if len(rows) > len(page) else None
+    translations = [{field: row[field] for field in fields} for row in page]
+    return jsonify({'translations': translations, 'next_cursor': next_cursor})
 
 @app.route('/translations/<int:translation_id>', methods=['GET'])
 @with_error_handling
 def get_translation(translation_id):
-    with sqlite3.connect(DB_PATH) as conn:
+    """The book texts are only included when named in ?fields=."""
+    try:
+        fields = requested_fields(TRANSLATION_FIELDS, TRANSLATION_FIELDS + list(TEXT_FIELDS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    texts = [field for field in fields if field in TEXT_FIELDS]
+    # Rows from before the blob store keep their texts inline
+    columns = [field for field in fields if field not in TEXT_FIELDS] + TEXT_SOURCE_FIELDS + texts
+
+    with database.connection() as conn:
         conn.row_factory = sqlite3.Row
-        cur = conn.execute('SELECT * FROM translations WHERE id = ?', (translation_id,))
+        cur = conn.execute(f'''
+            SELECT {', '.join(dict.fromkeys(columns))}
+            FROM translations
+            WHERE id = ?
+        ''', (translation_id,))
         translation = cur.fetchone()
-        if translation:
-            return jsonify(dict(translation))
+    if not translation:
         return jsonify({'error': 'Translation not found'}), 404
 
+    translation = dict(translation)
+    if texts:
+        # Unfinished translations keep their text in chunks; assemble it on demand
+        chunk_store.fill_texts(translation, texts)
+    return jsonify({field: translation[field] for field in fields})
+
+@app.route('/translations/<int:translation_id>/trace', methods=['GET'])
+@with_error_handling
+def get_translation_trace(translation_id):
+    """Span timeline of the latest run; ?format=chrome for chrome://tracing or Perfetto."""
+    trace = tracer.load(translation_id)
+    if trace is None:
+        return jsonify({'error': 'No trace recorded for this translation'}), 404
+
+    if request.args.get('format') == 'chrome':
+        response = Response(
+            json.dumps(Tracer.to_chrome(translation_id, trace['spans'])),
+            mimetype='application/json'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="trace_{translation_id}.json"'
+        return response
+    return jsonify({
+        'translation_id': translation_id,
+        'started_at': trace['started_at'],
+        'trace': Tracer.to_tree(trace['spans'])
+    })
+
 @app.route('/translate', methods=['POST'])
 @with_error_handling
 def translate():
@@ -187,114 +549,149 @@ def translate():
         return jsonify({'error': 'No file part'}), 400
 
     try:
-        file = request.files['file']
+        files = request.files.getlist('file')
         source_lang = request.form.get('sourceLanguage')
         target_lang = request.form.get('targetLanguage')
         model_name = request.form.get('model')
         llm_refine = request.form.get('llmRefine') == 'true' # Get llmRefine from form
+        # ?detach=true only queues the job(s); otherwise the job's progress is streamed back
+        detach = request.args.get('detach') == 'true'
 
-        if not all([file, source_lang, target_lang, model_name]):
+        if not all([files, source_lang, target_lang, model_name]):
             return jsonify({'error': 'Missing required parameters'}), 400
 
-        if file.filename == '':
-            return jsonify({'error': 'No selected file'}), 400
-
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Only the refinement stage needs Ollama
+        if llm_refine and not ollama_health.is_available():
+            return ollama_unavailable()
 
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read()
-        except UnicodeDecodeError:
-            with open(filepath, 'r', encoding='cp1251') as f:
-                text = f.read()
-
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.execute('''
-                INSERT INTO translations (
-                    filename, source_lang, target_lang, model,
-                    status, original_text, genre, llm_refine  -- Included llm_refine
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (filename, source_lang, target_lang, model_name,
-                  'in_progress', text, 'unknown', llm_refine))  # Set genre to 'unknown'
-            translation_id = cur.lastrowid
-
-        translator = BookTranslator(model_name=model_name)
-        translator.llm_refine = llm_refine # Set llm_refine attribute
-
-        def generate():
-            try:
-                for update in translator.translate_text(text, source_lang, target_lang, translation_id, logger, monitor, cache):
-                    yield f"data: {json.dumps(update, ensure_ascii=False)}\n\n"
-            except Exception as e:
-                error_message = str(e)
-                logger.translation_logger.error(f"Translation error: {error_message}")
-                logger.translation_logger.error(traceback.format_exc())
-                yield f"data: {json.dumps({'error': error_message})}\n\n"
+        if any(file.filename == '' for file in files):
+            return jsonify({'error': 'No selected file'}), 400
 
-        return Response(generate(), mimetype='text/event-stream')
+        if len(files) > 1 and not detach:
+            return jsonify({'error': 'Multiple files require detach=true'}), 400
+
+        translation_ids = []
+        for file in files:
+            filename = secure_filename(file.filename)
+
+            # Stream the upload into the blob store; the row only keeps its digest
+            digest, size = blob_store.put_stream(file.stream)
+            encoding = detect_encoding(blob_store.read_prefix(digest))
+            logger.app_logger.info(f"Stored upload {filename}: {size} bytes, {encoding}, blob {digest}")
+
+            with database.connection() as conn:
+                cur = conn.execute('''
+                    INSERT INTO translations (
+                        filename, source_lang, target_lang, model,
+                        status, original_blob, original_encoding, genre, llm_refine  -- Included llm_refine
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (filename, source_lang, target_lang, model_name,
+                      'pending', digest, encoding, 'unknown', llm_refine))  # Set genre to 'unknown'
+                translation_ids.append(cur.lastrowid)
+
+        if detach:
+            job_queue.notify(len(translation_ids))
+            return jsonify({'translation_ids': translation_ids}), 202
+
+        # Subscribe before waking a worker so the client sees the job from its first event
+        response = stream_job(translation_ids[0])
+        job_queue.notify()
+        return response
 
     except Exception as e:
         logger.app_logger.error(f"Translation request error: {str(e)}")
         logger.app_logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
-    finally:
-        try:
-            if 'filepath' in locals():
-                os.remove(filepath)
-        except Exception as e:
-            logger.app_logger.error(f"Failed to cleanup uploaded file: {str(e)}")
+
+@app.route('/translations/<int:translation_id>/events', methods=['GET'])
+@with_error_handling
+def translation_events(translation_id):
+    with database.connection() as conn:
+        exists = conn.execute('SELECT 1 FROM translations WHERE id = ?', (translation_id,)).fetchone()
+    if not exists:
+        return jsonify({'error': 'Translation not found'}), 404
+    return stream_job(translation_id)
 
 @app.route('/download/<int:translation_id>', methods=['GET'])
 @with_error_handling
 def download_translation(translation_id):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.connection() as conn:
         cur = conn.execute('''
-            SELECT filename, translated_text
+            SELECT filename
             FROM translations
             WHERE id = ? AND status = 'completed'
         ''', (translation_id,))
         result = cur.fetchone()
-        
-        if not result:
-            return jsonify({'error': 'Translation not found or not completed'}), 404
-        
-        filename, translated_text = result
-        
-        # Create download file with raw text
-        download_path = os.path.join(TRANSLATIONS_FOLDER, f'translated_{filename}')
-        with open(download_path, 'w', encoding='utf-8') as f:
-            f.write(translated_text)
-            
-        return send_file(
-            download_path,
+
+    digest = chunk_store.translated_blob(translation_id) if result else None
+    if not digest:
+        return jsonify({'error': 'Translation not found or not completed'}), 404
+
+    download_name = f'translated_{result[0]}'
+    # A blob never changes, so its digest is a strong ETag for both encodings
+    if request.range is None and request.accept_encodings['gzip']:
+        response = Response(blob_store.iter_gzip(digest), mimetype='text/plain')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.set_etag(f'{digest}-gzip')
+        response = response.make_conditional(request)
+    else:
+        # send_file answers If-None-Match and Range requests itself
+        response = send_file(
+            os.path.abspath(blob_store.path(digest)),
+            mimetype='text/plain',
             as_attachment=True,
-            download_name=f'translated_{filename}'
+            download_name=download_name,
+            etag=digest
         )
+    response.vary.add('Accept-Encoding')
+    # Clients revalidate with the ETag; a match costs a 304 and no read
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/failed-translations', methods=['GET'])
 @with_error_handling
 def get_failed_translations():
-    return jsonify(recovery.get_failed_translations())
+    try:
+        fields = requested_fields(FAILED_FIELDS, TRANSLATION_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(recovery.get_failed_translations(fields))
 
 @app.route('/retry-translation/<int:translation_id>', methods=['POST'])
 @with_error_handling
 def retry_failed_translation(translation_id):
-    recovery.retry_translation(translation_id)
+    if not recovery.retry_translation(translation_id):
+        with database.connection() as conn:
+            row = conn.execute('SELECT status FROM translations WHERE id = ?', (translation_id,)).fetchone()
+        if row is None:
+            return jsonify({'error': 'Translation not found'}), 404
+        return jsonify({'error': f"Only failed translations can be retried; this one is {row[0]}"}), 409
+    job_queue.notify()
     return jsonify({'status': 'success'})
 
 @app.route('/metrics', methods=['GET'])
 def get_metrics():
-    return jsonify(monitor.get_metrics())
+    metrics = monitor.get_metrics()
+    metrics['refinement_endpoints'] = refinement_dispatcher.get_stats()
+    metrics['machine_translation_rate_limit'] = mt_limiter.get_stats()
+    metrics['cache_metrics'] = cache.get_stats()
+    metrics['database_connections'] = {'translations': database.get_stats(), 'cache': cache_database.get_stats()}
+    metrics['write_behind'] = {'translations': writer.get_stats(), 'cache': cache_writer.get_stats()}
+    return jsonify(metrics)
+
+@app.route('/metrics/prometheus', methods=['GET'])
+def get_prometheus_metrics():
+    return Response(monitor.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/health', methods=['GET'])
 def health_check():
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        response.raise_for_status()
+        ollama_status = ollama_health.get_status()
+        if not ollama_status['available']:
+            raise ConnectionError("Ollama is not reachable")
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.connection() as conn:
             conn.execute('SELECT 1')
             
         disk_usage = psutil.disk_usage('/')
@@ -304,6 +701,7 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'ollama': 'connected',
+            'ollama_endpoints': ollama_status['endpoints'],
             'database': 'connected',
             'disk_usage': f"{disk_usage.percent}%"
         })
@@ -314,6 +712,14 @@ def health_check():
             'error': str(e)
         }), 503
 
+def referenced_blobs() -> set:
+    with database.connection() as conn:
+        cur = conn.execute('''
+            SELECT original_blob, machine_translation_blob, translated_blob
+            FROM translations
+        ''')
+        return {digest for row in cur for digest in row if digest}
+
 def cleanup_old_data():
     while True:
         try:
@@ -330,14 +736,40 @@ def cleanup_old_data():
             except Exception as e:
                 logger.app_logger.error(f"Failed translations cleanup error: {str(e)}")
 
+            try:
+                with database.connection() as conn:
+                    conn.execute('DELETE FROM traces WHERE translation_id NOT IN (SELECT id FROM translations)')
+                logger.app_logger.info("Trace cleanup completed")
+            except Exception as e:
+                logger.app_logger.error(f"Trace cleanup error: {str(e)}")
+
+            try:
+                removed = blob_store.remove_unreferenced(referenced_blobs())
+                logger.app_logger.info(f"Blob cleanup completed: {removed} unreferenced blobs removed")
+            except Exception as e:
+                logger.app_logger.error(f"Blob cleanup error: {str(e)}")
+
             time.sleep(24 * 60 * 60)  # Run daily
         except Exception as e:
             logger.app_logger.error(f"Cleanup task error: {str(e)}")
             time.sleep(60 * 60)  # Retry in an hour
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=cleanup_old_data, daemon=True)
-cleanup_thread.start()
+def start_background_tasks():
+    # Start cleanup thread
+    cleanup_thread = threading.Thread(target=cleanup_old_data, daemon=True)
+    cleanup_thread.start()
+
+    # Start Ollama prober
+    ollama_health.start()
+
+    # Start translation workers
+    job_queue.start()
+
+# With debug on, the werkzeug reloader runs this file in a watcher process as well as in the
+# child that serves requests (WERKZEUG_RUN_MAIN=true). Workers started in the watcher would claim
+# jobs whose events no client can subscribe to, and re-queue the jobs the child is running.
+if __name__ != "__main__" or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_background_tasks()
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file